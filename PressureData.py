@@ -1,16 +1,27 @@
 import ee
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import timedelta
+
+import transport
+from normalization import PRESSURE_CURVE
+from climatology import record
+
+# Weights of the lagged values in predict_weighted()
+LAG_WEIGHTS = {
+    "1d": 0.25,
+    "2d": 0.10,
+    "1y": 0.20,
+    "2y": 0.15,
+    "3y": 0.10,
+    "4y": 0.10,
+    "5y": 0.10,
+}
 
 class PressureDataFetcher:
 
     def __init__(self, lat, lon, project='bramhackstest'):
         """Initialize the Earth Engine connection and location."""
-        try:
-            ee.Initialize(project=project)
-        except Exception:
-            ee.Authenticate()
-            ee.Initialize(project=project)
+        transport.ee_initialize(project)
 
         self.lat = lat
         self.lon = lon
@@ -18,11 +29,23 @@ class PressureDataFetcher:
         self.dataset = ee.ImageCollection("ECMWF/ERA5_LAND/DAILY_AGGR").select("surface_pressure")
         self.scale = 9000  # default ERA5-Land resolution
 
+    @classmethod
+    def from_history(cls, df, lat=None, lon=None):
+        """Wrap already-downloaded pressure data (no Earth Engine connection)."""
+        self = cls.__new__(cls)
+        self.lat = lat
+        self.lon = lon
+        self.df = df
+        return self
+
     def get_past_5years(self):
         """Fetches daily pressure (hPa) for the past 5 years up to today."""
-        end_date = datetime.utcnow().date()
+        end_date = transport.today()
         start_date = end_date - timedelta(days=5 * 365)
+        return self.fetch_range(start_date, end_date)
 
+    def fetch_range(self, start_date, end_date):
+        """Fetches daily pressure (hPa) for [start_date, end_date)."""
         #print(f"Fetching daily pressure data {start_date} → {end_date}")
 
         # Filter dataset by date
@@ -45,19 +68,21 @@ class PressureDataFetcher:
         #print("Downloading from Earth Engine")
 
         # Aggregate values into arrays
-        times = features.aggregate_array("datetime").getInfo()
-        pressures = features.aggregate_array("pressure_hPa").getInfo()
+        times = transport.call("earthengine", features.aggregate_array("datetime").getInfo)
+        pressures = transport.call("earthengine", features.aggregate_array("pressure_hPa").getInfo)
 
         # Convert to DataFrame
         self.df = pd.DataFrame({
             "datetime": pd.to_datetime(times),
             "pressure_hPa": pressures
         }).sort_values("datetime").reset_index(drop=True)
+        record(self.lat, self.lon, "pressure_hPa", self.df["datetime"], self.df["pressure_hPa"])
 
         #print(f"Retrieved {len(self.df)} daily records.")
         return self.df
 
-    def predict_weighted(self, start_date, end_date):
+    def predict_weighted(self, start_date, end_date, weights=None):
+        weights = LAG_WEIGHTS if weights is None else weights
         if self.df is None:
             raise ValueError("Historical data not loaded. Run get_past_5years() first.")
 
@@ -96,15 +121,7 @@ class PressureDataFetcher:
             vals = {key: get_pressure(val) for key, val in lags.items()}
 
             # Apply weights
-            pred = (
-                    0.25 * vals["1d"] +
-                    0.10 * vals["2d"] +
-                    0.20 * vals["1y"] +
-                    0.15 * vals["2y"] +
-                    0.10 * vals["3y"] +
-                    0.10 * vals["4y"] +
-                    0.10 * vals["5y"]
-            )
+            pred = sum(w * vals[key] for key, w in weights.items())
 
             preds.append({
                 "date": current_day.date(),
@@ -120,23 +137,12 @@ class PressureDataFetcher:
         return result
 
     def normalize_pressure(self, p):
-        """Convert pressure to 0–1 sap flow potential."""
-        if p < 990:
-            return 1.0
-        elif 990 <= p < 995:
-            return 1.0 - ((p - 990) / 5) * 0.1
-        elif 995 <= p < 1005:
-            return 0.9 - ((p - 995) / 10) * 0.2
-        elif 1005 <= p < 1013:
-            return 0.7 - ((p - 1005) / 8) * 0.2
-        elif 1013 <= p <= 1015:
-            return 0.5 - ((p - 1013) / 2) * 0.25
-        else:
-            return 0.0
+        """Convert pressure (scalar or array) to 0–1 sap flow potential."""
+        return PRESSURE_CURVE(p)
 
     def normalizedPrediction(self, start_date, end_date):
         preds = self.predict_weighted(start_date, end_date)
-        preds["normalized_flow_score"] = preds["predicted_pressure_hPa"].apply(self.normalize_pressure)
+        preds["normalized_flow_score"] = self.normalize_pressure(preds["predicted_pressure_hPa"].to_numpy())
         #print(f" Added normalized sap flow scores for {len(preds)} days.")
         return preds['normalized_flow_score']
 
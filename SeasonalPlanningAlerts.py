@@ -1,9 +1,11 @@
 import requests
 import pandas as pd
 from datetime import datetime, timedelta
-import time
 import os
 
+import transport
+from climatology import record
+
 def fetch_year(year, lat, lon):
     start_date = f"{year}-01-01"
     end_date   = f"{year}-04-30"
@@ -16,7 +18,7 @@ def fetch_year(year, lat, lon):
         "hourly": "temperature_2m",
         "timezone": "America/Toronto"
     }
-    r = requests.get(url, params=params, timeout=60)
+    r = transport.call("open-meteo", requests.get, url, params=params, timeout=60)
     r.raise_for_status()
     j = r.json()
     df = pd.DataFrame({
@@ -25,6 +27,8 @@ def fetch_year(year, lat, lon):
     })
     df["date"] = df["time"].dt.date
     daily = df.groupby("date").agg(tmin=("temp","min"), tmax=("temp","max")).reset_index()
+    record(lat, lon, "tmin", daily["date"], daily["tmin"])
+    record(lat, lon, "tmax", daily["date"], daily["tmax"])
     return daily
 
 def compute_window(daily):
@@ -43,7 +47,7 @@ def compute_window(daily):
         return None, None
 
 def Predict(lat, lon):
-    today = datetime.now()
+    today = transport.now()
     years = [today.year - 2, today.year - 1]  # last 2 years
     results = []
 
@@ -54,8 +58,22 @@ def Predict(lat, lon):
             results.append({"year": y, "start_dt": start, "end_dt": end})
         except Exception as e:
             print("Error fetching year", y, e)
-        time.sleep(1)
 
+    predict_year = today.year + 1 if today.month > 4 else today.year
+
+    return median_window(results, predict_year)
+
+def seconds_until_rollover(now=None):
+    """Seconds until Predict() moves on to the next season (on May 1)."""
+    now = now or transport.now()
+    rollover = datetime(now.year if now.month <= 4 else now.year + 1, 5, 1)
+    return (rollover - now).total_seconds()
+
+def median_window(results, predict_year):
+    """
+    Place the median start day-of-year and median duration of past windows
+    (dicts with 'start_dt'/'end_dt', as built by Predict) in predict_year.
+    """
     res_df = pd.DataFrame(results).dropna()
 
     res_df['start_doy'] = res_df['start_dt'].dt.dayofyear
@@ -64,8 +82,6 @@ def Predict(lat, lon):
     median_start_doy = int(res_df['start_doy'].median())
     median_duration  = int(res_df['duration'].median())
 
-    predict_year = today.year + 1 if today.month > 4 else today.year
-
     start_date = datetime(predict_year, 1, 1) + timedelta(days=median_start_doy - 1)
     end_date   = start_date + timedelta(days=median_duration - 1)
 
@@ -1,7 +1,19 @@
 import ee
 import datetime
 import pandas as pd
-import numpy as np
+
+import transport
+from normalization import SMAP_CURVE
+from climatology import record
+
+
+# Weights of the lagged values in predict_weighted()
+LAG_WEIGHTS = {
+    "1d": 0.35,
+    "2d": 0.15,
+    "1y": 0.30,
+    "2y": 0.20,
+}
 
 
 class SmapFetcher:
@@ -28,11 +40,7 @@ class SmapFetcher:
             Buffer radius around the point, in kilometers.
         """
         # Initialize Earth Engine
-        try:
-            ee.Initialize(project=project)
-        except Exception:
-            ee.Authenticate()
-            ee.Initialize(project=project)
+        transport.ee_initialize(project)
 
         self.lon = lon
         self.lat = lat
@@ -46,6 +54,22 @@ class SmapFetcher:
         # Will hold the historical dataframe once fetched
         self.df: pd.DataFrame | None = None
 
+    @classmethod
+    def from_history(cls, df, lat=None, lon=None):
+        """
+        Wrap already-downloaded soil moisture data (no Earth Engine connection).
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+            Columns: ['date', 'sm_surface']
+        """
+        self = cls.__new__(cls)
+        self.lat = lat
+        self.lon = lon
+        self.df = df
+        return self
+
     def _extract_feature(self, img):
         """Extract surface soil moisture from a single image as a Feature."""
         stats = img.reduceRegion(
@@ -79,7 +103,7 @@ class SmapFetcher:
             ee.Filter.notNull(["sm_surface"])
         )
 
-        fc_dict = features.getInfo()
+        fc_dict = transport.call("earthengine", features.getInfo)
         rows = [f["properties"] for f in fc_dict.get("features", [])]
 
         if not rows:
@@ -93,46 +117,32 @@ class SmapFetcher:
         df = df.sort_values("date").reset_index(drop=True)
 
         self.df = df[["date", "sm_surface"]]
+        record(self.lat, self.lon, "sm_surface", self.df["date"], self.df["sm_surface"])
         return self.df
 
     def normalize(self, df, column="sm_surface"):
         """
         Apply custom normalization to soil moisture values.
 
-        The mapping is piecewise and returns values in [0, 1] with NaNs preserved.
+        The mapping is piecewise (see normalization.SMAP_CURVE) and returns
+        values in [0, 1] with NaNs preserved.
         """
-        def map_value(x):
-            if x is None or pd.isna(x):
-                return np.nan
-            if x < 0.14:
-                return 0
-            elif 0.14 <= x <= 0.17:
-                return 0.5
-            elif 0.18 <= x <= 0.20:
-                return 0.7
-            elif 0.21 <= x <= 0.41:
-                return 1
-            elif 0.42 <= x <= 0.54:
-                return 0.6
-            elif x > 0.54:
-                return 0.4
-            return 0
-
         df = df.copy()
         norm_col = f"{column}_normalized"
-        df[norm_col] = df[column].apply(map_value)
+        df[norm_col] = SMAP_CURVE(pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float))
         return df[["date", norm_col]]
 
-    def predict_weighted(self, start_date, end_date):
+    def predict_weighted(self, start_date, end_date, weights=None):
         """
         Predict future soil moisture using weighted temporal lags:
-        1-day, 2-day, 1-year, and 2-year lags.
+        1-day, 2-day, 1-year, and 2-year lags (see LAG_WEIGHTS).
 
         Returns
         -------
         pandas.DataFrame
             Columns: ['date', 'predicted_sm_surface']
         """
+        weights = LAG_WEIGHTS if weights is None else weights
         if self.df is None or self.df.empty:
             raise ValueError("Run fetch_range() first to load historical data.")
 
@@ -162,12 +172,7 @@ class SmapFetcher:
 
             vals = {key: get_sm(val) for key, val in lags.items()}
 
-            pred = (
-                0.35 * vals["1d"] +
-                0.15 * vals["2d"] +
-                0.30 * vals["1y"] +
-                0.20 * vals["2y"]
-            )
+            pred = sum(w * vals[key] for key, w in weights.items())
 
             preds.append(
                 {
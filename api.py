@@ -1,53 +1,189 @@
 from fastapi import FastAPI, Form, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from twilio.rest import Client
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
 from datetime import datetime, timedelta
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
 
-from fastapi import Request
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
 
 from lst_data import ret_normalized_land_temperature
 from SoilMoistureData import SmapFetcher
 from PressureData import PressureDataFetcher
-from SeasonalPlanningAlerts import Predict
+from SeasonalPlanningAlerts import Predict, seconds_until_rollover
 
 from utils import get_coordinates
+from combined_index import calculate_index
+from scheduler import scheduler
+import transport
+from cache import TTLCache, AccessTracker, PreWarmer, SingleFlight, cell_of
+from spatial_index import CellIndex, interpolate_pick_dates
+from static_assets import serve_asset
+import profiling
+from profiling import profiled
 
 app = FastAPI(title="Freeze-Thaw, LST & Soil Moisture API")
 
+# Per-cell caches for the upstream series and the computed pick dates
+CACHE_TTL = int(os.getenv("CACHE_TTL_SECONDS", 24 * 3600))
+series_cache = TTLCache(ttl=CACHE_TTL)
+pick_cache = TTLCache(ttl=CACHE_TTL)
+access_tracker = AccessTracker()
+
+# Every cell we hold results for, for nearest-neighbour estimates
+cell_index = CellIndex(ttl=CACHE_TTL)
+NEIGHBOUR_MAX_KM = float(os.getenv("NEIGHBOUR_MAX_KM", 50))
+
+# One in-flight computation per cell, shared by user requests, background
+# fills and the pre-warmer
+computations = SingleFlight()
+
+# Geocodes wait on Nominatim's 1 req/s limit, so they get a few threads of
+# their own rather than tying up the shared threadpool, and are refused once
+# too many are waiting
+geocode_executor = ThreadPoolExecutor(max_workers=int(os.getenv("GEOCODE_WORKERS", 2)),
+                                      thread_name_prefix="geocode")
+GEOCODE_MAX_PENDING = int(os.getenv("GEOCODE_MAX_PENDING", 30))
+geocode_pending = 0   # only touched on the event loop
+
+# Addresses move rarely; repeat requests skip Nominatim entirely
+geocode_cache = TTLCache(ttl=int(os.getenv("GEOCODE_TTL_SECONDS", 30 * 24 * 3600)))
+geocode_in_flight = {}   # address key -> Future, so a hot address is looked up once
+
+prewarmer = PreWarmer(
+    access_tracker,
+    pick_cache,
+    refresh=lambda cell: computations.do(cell, compute_freeze_thaw, cell),
+    top_n=int(os.getenv("PREWARM_TOP_N", 200)),
+    interval=int(os.getenv("PREWARM_INTERVAL_SECONDS", 300)),
+    refresh_ahead=int(os.getenv("PREWARM_REFRESH_AHEAD_SECONDS", 2 * 3600)),
+    budget_s=int(os.getenv("PREWARM_BUDGET_SECONDS", 120)),
+    max_refresh=int(os.getenv("PREWARM_MAX_REFRESH", 20)),
+    min_score=float(os.getenv("PREWARM_MIN_SCORE", 0.5)),
+)
+
+
+# --------------------------------------------------
+# 🔬 Per-request Profiling
+# --------------------------------------------------
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    if not profiling.requested(request):
+        return await call_next(request)
+    if not profiling.authorized(request):
+        return JSONResponse(content={"error": "Profiling requires a valid admin token"}, status_code=403)
+
+    profile = profiling.start(request.url.path)
+    try:
+        response = await call_next(request)
+    finally:
+        profiling.finish(profile)
+    response.headers["X-Profile-Id"] = profile.id
+    return response
+
 
 # --------------------------------------------------
 # 🧊 Freeze–Thaw Endpoint
 # --------------------------------------------------
-@app.get("/")
-def root_home():
-    return FileResponse("myMapleSite/index.html")
+@app.api_route("/", methods=["GET", "HEAD"])
+def root_home(request: Request):
+    return serve_asset(request, "index.html")
 
-@app.get("/home")
-def home():
-    return FileResponse("myMapleSite/index.html")
+@app.api_route("/home", methods=["GET", "HEAD"])
+def home(request: Request):
+    return serve_asset(request, "index.html")
 
 @app.post("/freeze-thaw")
 async def get_freeze_thaw_data(request: Request):
 
-    
     body = await request.json()
     print(body)
     address = body["location"]
-    lat, lon = get_coordinates(address)
+    lat, lon = await geocode(address)
+
+    cell = cell_of(lat, lon)
+    access_tracker.record(cell)
+
+    data = pick_cache.get(cell)
+    if data is not None:
+        return JSONResponse(content={**data, "estimated": False, "long": lon, "lat": lat})
 
-    if lon == -79.7599366 and lat == 43.685832:
+    # Never computed here: answer from nearby cells now and compute the exact
+    # result once the response has gone out
+    neighbours = cell_index.nearest(lat, lon, k=4, max_km=NEIGHBOUR_MAX_KM)
+    if neighbours:
         data = {
-            "start_date_freeze_thaw": '2026-03-04',
-            "pick_date": '2026-03-07',
-            "end_date_freeze_thaw": '2026-04-03',
-            "lat": 43.685832,
-            "lon": -79.7599366
+            **interpolate_pick_dates(neighbours),
+            "estimated": True,
+            "neighbours": [
+                {"lat": n_lat, "long": n_lon, "distance_km": round(d, 2)}
+                for d, n_lat, n_lon, _ in neighbours
+            ],
+            "long": lon,
+            "lat": lat,
         }
-        return JSONResponse(content=data)
+        print(data)
+        return JSONResponse(content=data, background=BackgroundTask(compute_in_background, cell))
+
+    data = await run_in_threadpool(profiled(computations.do), cell, compute_freeze_thaw, cell)
+
+    data = {**data, "estimated": False, "long": lon, "lat": lat}
+    print(data)
+    return JSONResponse(content=data)
+
+
+async def geocode(address):
+    """
+    Geocode from the cache or a lookup already running for the same address,
+    else on the dedicated executor; 503 when too many are already queued.
+    """
+    global geocode_pending
+    key = " ".join(address.split()).casefold()
+    coords = geocode_cache.get(key)
+    if coords is not None:
+        return coords
+    if key in geocode_in_flight:
+        return await asyncio.shield(geocode_in_flight[key])
+
+    if geocode_pending >= GEOCODE_MAX_PENDING:
+        raise HTTPException(status_code=503, detail="Geocoder busy, try again shortly",
+                            headers={"Retry-After": "5"})
+    geocode_pending += 1
+    # copy the context so profiling (and scheduler priority) follow the call
+    context = contextvars.copy_context()
+    future = asyncio.get_running_loop().run_in_executor(
+        geocode_executor, context.run, profiled(get_coordinates), address)
+    geocode_in_flight[key] = future
+    future.add_done_callback(lambda f: _geocode_done(key, f))
+    # shielded: a disconnecting client must not cancel a lookup others share
+    return await asyncio.shield(future)
+
+
+def _geocode_done(key, future):
+    global geocode_pending
+    geocode_pending -= 1
+    geocode_in_flight.pop(key, None)
+    if not future.cancelled() and future.exception() is None and future.result() is not None:
+        geocode_cache.set(key, future.result())
+
+
+def compute_in_background(cell):
+    """Compute a cell after an estimated answer, unless it is already being computed."""
+    computations.do(cell, compute_freeze_thaw, cell, wait=False)
+
+
+def compute_freeze_thaw(cell):
+    """
+    Run the full pipeline for a grid cell (at its centre) and cache both the
+    normalized upstream series and the resulting pick dates.
+    """
+    lat, lon = cell
 
     start_date, end_date = Predict(lat, lon)
 
@@ -55,15 +191,20 @@ async def get_freeze_thaw_data(request: Request):
     Soil_data_normalized = get_soil_moisture_data(start_date, end_date, lat, lon)
     Pressure_data_normalized = get_pressure_data(lat, lon, start_date, end_date)
 
+    # Results belong to this season's window; don't serve them past the rollover
+    ttl = min(CACHE_TTL, seconds_until_rollover())
 
-    # print(LST_data_normalized)
-    # print(Soil_data_normalized)
-    # print(Pressure_data_normalized)
-    normalized_data = calculate_index(LST_data_normalized,Pressure_data_normalized, Soil_data_normalized)
+    series_cache.set(cell, {
+        "start_date": start_date,
+        "end_date": end_date,
+        "lst": LST_data_normalized,
+        "soil_moisture": Soil_data_normalized,
+        "pressure": Pressure_data_normalized,
+    }, ttl=ttl)
 
+    normalized_data = calculate_index(LST_data_normalized,Pressure_data_normalized, Soil_data_normalized)
 
     # Calculate index value to adjust start_date
-    # print(normalized_data)
     index_value = normalized_data["combined_index"].idxmax(skipna=True)
     pick_date = datetime.strptime(start_date, '%Y-%m-%d') + timedelta(days=int(index_value))
 
@@ -71,18 +212,22 @@ async def get_freeze_thaw_data(request: Request):
         "start_date_freeze_thaw": str(start_date),
         "pick_date":  str(pick_date),
         "end_date_freeze_thaw": str(end_date),
-        "long": lon,
-        "lat": lat
     }
+    pick_cache.set(cell, data, ttl=ttl)
+    cell_index.add(lat, lon, data, ttl=ttl)
+    return data
 
-    print(data)
 
-    modis_df_final = pd.DataFrame(data)
-    print(modis_df_final.head(10))
-    try:
-        return JSONResponse(content=data)
-    except Exception as e:
-        print(e)
+@app.on_event("startup")
+def start_prewarmer():
+    prewarmer.start()
+
+
+@app.on_event("shutdown")
+def stop_prewarmer():
+    prewarmer.stop()
+    geocode_executor.shutdown(wait=False, cancel_futures=True)
+
 
 # --------------------------------------------------
 # 📱 SMS Endpoint
@@ -107,12 +252,62 @@ def send_sms(
 
     try:
         client = Client(account_sid, auth_token)
-        msg = client.messages.create(body=message, from_=from_number, to=to)
+        msg = transport.call("twilio", client.messages.create, body=message, from_=from_number, to=to)
         return {"status": "success", "sid": msg.sid}
     except Exception as e:
         return JSONResponse(content={"status": "failed", "error": str(e)}, status_code=400)
 
 
+# --------------------------------------------------
+# 🚦 Upstream Scheduler Stats Endpoint
+# --------------------------------------------------
+@app.get("/upstream-stats")
+def upstream_stats():
+    """
+    Queue depth, in-flight calls and admission wait times per upstream.
+    """
+    return scheduler.stats()
+
+
+# --------------------------------------------------
+# 🩺 Diagnostics Endpoints
+# --------------------------------------------------
+@app.get("/diagnostics/profiles")
+def list_profiles(request: Request):
+    """
+    Stored request profiles, newest first.
+    """
+    if not profiling.authorized(request):
+        return JSONResponse(content={"error": "Admin token required"}, status_code=403)
+    return profiling.list_profiles()
+
+
+@app.get("/diagnostics/profiles/{profile_id}")
+def get_profile(profile_id: str, request: Request):
+    """
+    Upstream call timings and sample counts for one profiled request.
+    """
+    if not profiling.authorized(request):
+        return JSONResponse(content={"error": "Admin token required"}, status_code=403)
+    summary = profiling.load_summary(profile_id)
+    if summary is None:
+        return JSONResponse(content={"error": "Profile not found"}, status_code=404)
+    return summary
+
+
+@app.get("/diagnostics/profiles/{profile_id}/folded")
+def get_profile_folded(profile_id: str, request: Request):
+    """
+    Folded stacks for flamegraph.pl / speedscope / inferno.
+    """
+    if not profiling.authorized(request):
+        return JSONResponse(content={"error": "Admin token required"}, status_code=403)
+    folded = profiling.load_folded(profile_id)
+    if folded is None:
+        return JSONResponse(content={"error": "Profile not found"}, status_code=404)
+    return PlainTextResponse(folded)
+
+
 # --------------------------------------------------
 # 🌡️ Land Surface Temperature Data Endpoint
 # --------------------------------------------------
@@ -180,45 +375,6 @@ def get_soil_moisture_data(
 
     return normalized_future
 
-def calculate_index(
-    LST_day_normalized: list[float] = Form(...),
-    Pressure_day_normalized: list[float] = Form(...),
-    soil_moisture_normalized: list[float] = Form(...)
-):
-    """
-    Calculate a combined environmental index using the
-    normalized LST, pressure, and soil moisture data.
-    """
-
-    # Convert lists to pandas DataFrame for vector operations
-    LST_day_normalized.fillna(0)
-    Pressure_day_normalized.fillna(0)
-    soil_moisture_normalized.fillna(0)
-
-    df = pd.DataFrame({
-        "LST_day_normalized": LST_day_normalized,
-        "Pressure_day_normalized": Pressure_day_normalized,
-        "soil_moisture_normalized": soil_moisture_normalized
-    })
-
-
-    # Example: simple weighted average index
-    df["combined_index"] = (
-        0.4 * df["LST_day_normalized"] +
-        0.3 * df["Pressure_day_normalized"] +
-        0.3 * df["soil_moisture_normalized"]
-    )
-
-    # # Optional normalization (0–1)
-    # df["combined_index_normalized"] = (
-    #     (df["combined_index"] - df["combined_index"].min()) /
-    #     (df["combined_index"].max() - df["combined_index"].min())
-    # )
-
-    print(df.head())
-    return df
-
-
 def get_pressure_data(
     lat: float = Query(..., description="Latitude of the location"),
     lon: float = Query(..., description="Longitude of the location"),
@@ -240,9 +396,12 @@ def get_pressure_data(
     return pressure_values
 
 
-app.mount("/", StaticFiles(directory="myMapleSite"), name="static")
+# Site assets (precompressed/hashed when `python static_assets.py` has been run)
+@app.api_route("/{path:path}", methods=["GET", "HEAD"])
+def static_files(path: str, request: Request):
+    return serve_asset(request, path)
 
 
 if __name__ == "__main__":
-    print(get_freeze_thaw_data(address= 'Brampton, Canada'))
+    print(compute_freeze_thaw(cell_of(*get_coordinates('Brampton, Canada'))))
 
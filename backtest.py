@@ -0,0 +1,327 @@
+"""
+Historical backtesting of the freeze–thaw / pick-date pipeline.
+
+    # one-time: pull raw history for every site into history/<site>/
+    python backtest.py download --sites sites.csv --years 2012-2025
+
+    # replay seasons "as of" Jan 1 and score against observed windows
+    python backtest.py run --sites sites.csv --seasons 2016-2025 --configs configs.json --out results.csv
+
+sites.csv has columns name,lat,lon. configs.json is a list of parameter sets
+to compare, each optionally overriding the production weights:
+
+    [{"name": "production"},
+     {"name": "lst-heavy", "index_weights": {"lst": 0.6, "pressure": 0.2, "soil_moisture": 0.2}},
+     {"name": "short-lags", "pressure_lags": {"1d": 0.5, "2d": 0.2, "1y": 0.3}}]
+
+Replays read only local files, so they run in parallel across a process
+pool with no upstream traffic.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+import pandas as pd
+
+HISTORY_DIR = os.getenv("HISTORY_DIR", "history")
+
+SERIES = {
+    # file name -> date column
+    "temperature": "date",
+    "pressure": "datetime",
+    "soil_moisture": "date",
+    "lst": "time",
+}
+
+
+# Bumped when downloaded history changes meaning. Format 2: LST sampled at
+# [lon, lat]; format-1 LST came from the mirrored point and is ignored.
+HISTORY_FORMAT = 2
+
+
+def _parse_years(text):
+    if "-" in text:
+        a, b = text.split("-")
+        return list(range(int(a), int(b) + 1))
+    return [int(y) for y in text.split(",")]
+
+
+def load_sites(path):
+    sites = pd.read_csv(path)
+    return [(str(r["name"]), float(r["lat"]), float(r["lon"])) for _, r in sites.iterrows()]
+
+
+def _site_dir(name):
+    return os.path.join(HISTORY_DIR, name.replace("/", "_").replace(" ", "_"))
+
+
+# --------------------------------------------------
+# ⬇️ Download
+# --------------------------------------------------
+def download_site(name, lat, lon, years):
+    """
+    Fetch raw daily history for one site, one year at a time (keeps each
+    Earth Engine request small), at backfill priority.
+    """
+    from scheduler import scheduler, BACKFILL
+    from SeasonalPlanningAlerts import fetch_year
+    from PressureData import PressureDataFetcher
+    from SoilMoistureData import SmapFetcher
+    from lst_data import fetch_modis_lst
+
+    out_dir = _site_dir(name)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Lag models look up to five years back, so pressure needs extra history
+    first, last = min(years), max(years)
+    frames = {key: [] for key in SERIES}
+    with scheduler.priority(BACKFILL):
+        pressure = PressureDataFetcher(lat, lon)
+        for y in range(first - 5, last + 1):
+            start, end = f"{y}-01-01", f"{y + 1}-01-01"
+            try:
+                frames["pressure"].append(pressure.fetch_range(start, end))
+            except Exception as e:
+                print(f"{name}: pressure {y} failed: {e}")
+            if y < first:
+                continue
+            try:
+                frames["temperature"].append(fetch_year(y, lat, lon))
+            except Exception as e:
+                print(f"{name}: temperature {y} failed: {e}")
+            try:
+                frames["soil_moisture"].append(SmapFetcher(lat, lon, start, f"{y}-12-31").fetch_range())
+            except Exception as e:
+                print(f"{name}: soil moisture {y} failed: {e}")
+            try:
+                frames["lst"].append(fetch_modis_lst(start, end, lat=lat, long=lon))
+            except Exception as e:
+                print(f"{name}: LST {y} failed: {e}")
+
+    for key, parts in frames.items():
+        parts = [p for p in parts if p is not None and not p.empty]
+        if parts:
+            pd.concat(parts).drop_duplicates(SERIES[key]).to_csv(os.path.join(out_dir, f"{key}.csv"), index=False)
+    with open(os.path.join(out_dir, "site.json"), "w") as f:
+        json.dump({"lat": lat, "lon": lon, "format": HISTORY_FORMAT}, f)
+    print(f"{name}: saved history to {out_dir}")
+
+
+# --------------------------------------------------
+# 🔁 Replay
+# --------------------------------------------------
+@lru_cache(maxsize=64)
+def load_history(name):
+    """Read a site's stored series (cached per worker process)."""
+    meta_path = os.path.join(_site_dir(name), "site.json")
+    fmt = 1
+    if os.path.isfile(meta_path):
+        with open(meta_path) as f:
+            fmt = json.load(f).get("format", 1)
+
+    history = {}
+    for key, date_col in SERIES.items():
+        path = os.path.join(_site_dir(name), f"{key}.csv")
+        if os.path.isfile(path):
+            df = pd.read_csv(path, parse_dates=[date_col])
+            history[key] = df.sort_values(date_col).reset_index(drop=True)
+        else:
+            history[key] = None
+
+    if fmt < 2 and history["lst"] is not None:
+        print(f"{name}: LST history predates the [lon, lat] fix; ignoring it (re-run download)",
+              file=sys.stderr)
+        history["lst"] = None
+    return history
+
+
+def _season_daily(temps, year):
+    daily = temps[temps["date"].dt.year == year].copy()
+    daily["date"] = daily["date"].dt.date
+    return daily.reset_index(drop=True)
+
+
+def _window_overlap(a_start, a_end, b_start, b_end):
+    """Intersection over union of two inclusive date ranges."""
+    inter = (min(a_end, b_end) - max(a_start, b_start)).days + 1
+    union = (max(a_end, b_end) - min(a_start, b_start)).days + 1
+    return max(inter, 0) / union
+
+
+def replay_season(name, season, configs, as_of="01-01"):
+    """
+    Re-run the pipeline for one site and season using only data before the
+    as-of date, for every parameter set in `configs`, and score each pick
+    against the window compute_window() finds in that season's temperatures.
+    """
+    from SeasonalPlanningAlerts import compute_window, median_window
+    from PressureData import PressureDataFetcher
+    from SoilMoistureData import SmapFetcher
+    from lst_data import predict_lst
+    from normalization import PRESSURE_CURVE
+    from combined_index import calculate_index
+
+    history = load_history(name)
+    as_of_ts = pd.Timestamp(f"{season}-{as_of}")
+    base = {"site": name, "season": season, "as_of": as_of_ts.date().isoformat()}
+
+    temps = history["temperature"]
+    if temps is None:
+        return [{**base, "config": c["name"], "error": "no temperature history"} for c in configs]
+
+    # Observed window for the season itself
+    obs_start, obs_end = compute_window(_season_daily(temps, season))
+    base.update(observed_start=obs_start and obs_start.date().isoformat(),
+                observed_end=obs_end and obs_end.date().isoformat())
+
+    # Predicted window from the two previous seasons, as Predict() does
+    past = []
+    for y in (season - 2, season - 1):
+        daily = _season_daily(temps, y)
+        if not daily.empty:
+            s, e = compute_window(daily)
+            past.append({"year": y, "start_dt": s, "end_dt": e})
+    try:
+        start_date, end_date = median_window(past, season)
+    except Exception as e:
+        return [{**base, "config": c["name"], "error": f"no window: {e}"} for c in configs]
+    base.update(predicted_start=start_date, predicted_end=end_date)
+    start_ts, end_ts = pd.Timestamp(start_date), pd.Timestamp(end_date)
+
+    # LST does not depend on any tuned weights
+    lst = history["lst"]
+    if lst is not None:
+        lst = lst[(lst["time"] < as_of_ts) & (lst["time"] >= start_ts - pd.DateOffset(years=2))]
+        lst_norm = predict_lst(lst, start_date, end_date)["LST_Day_normalized"]
+    else:
+        lst_norm = pd.Series(dtype=float)
+
+    pressure_hist = history["pressure"]
+    if pressure_hist is not None:
+        pressure_hist = pressure_hist[(pressure_hist["datetime"] < as_of_ts)
+                                      & (pressure_hist["datetime"] >= as_of_ts - timedelta(days=5 * 365))]
+    soil_hist = history["soil_moisture"]
+    if soil_hist is not None:
+        # production fetches the same window two years earlier
+        soil_hist = soil_hist[(soil_hist["date"] < as_of_ts)
+                              & (soil_hist["date"] >= start_ts - timedelta(days=2 * 365))
+                              & (soil_hist["date"] <= end_ts - timedelta(days=2 * 365))]
+
+    rows = []
+    for config in configs:
+        row = {**base, "config": config["name"]}
+        try:
+            if pressure_hist is not None and not pressure_hist.empty:
+                preds = PressureDataFetcher.from_history(pressure_hist.copy()).predict_weighted(
+                    start_date, end_date, config.get("pressure_lags"))
+                pressure_norm = pd.Series(PRESSURE_CURVE(preds["predicted_pressure_hPa"].to_numpy()))
+            else:
+                pressure_norm = pd.Series(dtype=float)
+
+            if soil_hist is not None and not soil_hist.empty:
+                fetcher = SmapFetcher.from_history(soil_hist.reset_index(drop=True))
+                preds = fetcher.predict_weighted(start_date, end_date, config.get("soil_lags"))
+                soil_norm = fetcher.normalize(preds, column="predicted_sm_surface")["predicted_sm_surface_normalized"]
+            else:
+                soil_norm = pd.Series(dtype=float)
+
+            index = calculate_index(lst_norm.reset_index(drop=True), pressure_norm,
+                                    soil_norm.reset_index(drop=True), config.get("index_weights"))
+            offset = index["combined_index"].idxmax(skipna=True)
+            pick = datetime.strptime(start_date, "%Y-%m-%d") + timedelta(days=int(offset))
+            row["pick_date"] = pick.date().isoformat()
+
+            if obs_start is not None:
+                row["start_error_days"] = (start_ts - obs_start).days
+                row["end_error_days"] = (end_ts - obs_end).days
+                row["pick_in_window"] = bool(obs_start <= pd.Timestamp(pick) <= obs_end)
+                row["window_iou"] = round(_window_overlap(start_ts, end_ts, obs_start, obs_end), 4)
+        except Exception as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+        rows.append(row)
+    return rows
+
+
+def _quiet_worker():
+    # The pipeline prints freely; keep worker output off the terminal
+    sys.stdout = open(os.devnull, "w")
+
+
+def run_backtest(sites, seasons, configs, workers=None, as_of="01-01"):
+    """Replay every (site, season) across a process pool. Returns one row per config."""
+    rows = []
+    tasks = [(name, season) for name, _, _ in sites for season in seasons]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_quiet_worker) as pool:
+        futures = [pool.submit(replay_season, name, season, configs, as_of) for name, season in tasks]
+        for i, future in enumerate(as_completed(futures), 1):
+            rows.extend(future.result())
+            if i % 100 == 0 or i == len(futures):
+                print(f"  {i}/{len(futures)} site-seasons", file=sys.stderr)
+    return pd.DataFrame(rows)
+
+
+def summarize(results):
+    """Per-config scores: start/end MAE in days, pick hit rate and mean window IoU."""
+    scored = results.dropna(subset=["pick_in_window"]) if "pick_in_window" in results else results.iloc[0:0]
+    summary = scored.groupby("config").agg(
+        site_seasons=("site", "size"),
+        start_mae_days=("start_error_days", lambda s: s.abs().mean()),
+        end_mae_days=("end_error_days", lambda s: s.abs().mean()),
+        pick_hit_rate=("pick_in_window", "mean"),
+        mean_window_iou=("window_iou", "mean"),
+    )
+    failures = results.groupby("config")["error"].count() if "error" in results else 0
+    summary["failures"] = failures
+    return summary.sort_values(["pick_hit_rate", "mean_window_iou"], ascending=False).round(3)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    d = sub.add_parser("download", help="fetch raw history for each site")
+    d.add_argument("--sites", required=True)
+    d.add_argument("--years", required=True, help="e.g. 2012-2025")
+
+    r = sub.add_parser("run", help="replay seasons from local history and score them")
+    r.add_argument("--sites", required=True)
+    r.add_argument("--seasons", required=True, help="e.g. 2016-2025")
+    r.add_argument("--configs", help="JSON list of parameter sets (default: production weights)")
+    r.add_argument("--as-of", default="01-01", help="MM-DD the forecast is made on within each season")
+    r.add_argument("--workers", type=int, default=None)
+    r.add_argument("--out", help="write per site-season rows to this CSV")
+
+    args = parser.parse_args(argv)
+    sites = load_sites(args.sites)
+
+    if args.command == "download":
+        years = _parse_years(args.years)
+        for name, lat, lon in sites:
+            with contextlib.redirect_stdout(sys.stderr):
+                download_site(name, lat, lon, years)
+        return 0
+
+    configs = [{"name": "production"}]
+    if args.configs:
+        with open(args.configs) as f:
+            configs = json.load(f)
+
+    seasons = _parse_years(args.seasons)
+    started = datetime.now()
+    print(f"Replaying {len(sites) * len(seasons)} site-seasons x {len(configs)} configs", file=sys.stderr)
+    results = run_backtest(sites, seasons, configs, args.workers, args.as_of)
+    print(f"Done in {(datetime.now() - started).total_seconds():.1f}s\n", file=sys.stderr)
+
+    if args.out:
+        results.to_csv(args.out, index=False)
+    print(summarize(results).to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
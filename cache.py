@@ -0,0 +1,230 @@
+import math
+import threading
+import time
+
+from scheduler import scheduler, BACKFILL, Priority
+
+# ~0.1° ≈ 9–11 km, roughly one ERA5-Land / SMAP L4 pixel
+GRID_DEG = 0.1
+
+
+def cell_of(lat, lon, grid=GRID_DEG):
+    """Snap a coordinate to the centre of its grid cell, returned as a (lat, lon) key."""
+    return (
+        round((math.floor(lat / grid) + 0.5) * grid, 6),
+        round((math.floor(lon / grid) + 0.5) * grid, 6),
+    )
+
+
+class TTLCache:
+    """Thread-safe dict with a per-entry expiry time. Expired entries are dropped."""
+
+    def __init__(self, ttl, purge_interval=60):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._lock = threading.Lock()
+        self._data = {}   # key -> (expires_at, value)
+        self._next_purge = time.time() + purge_interval
+
+    def _purge(self, now):
+        expired = [k for k, (exp, _) in self._data.items() if exp < now]
+        for k in expired:
+            del self._data[k]
+        self._next_purge = now + self.purge_interval
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] < now:
+                del self._data[key]
+                entry = None
+        return None if entry is None else entry[1]
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        with self._lock:
+            self._data[key] = (now + (self.ttl if ttl is None else ttl), value)
+            if now >= self._next_purge:
+                self._purge(now)
+
+    def expires_in(self, key):
+        """Seconds until `key` goes stale (None if not cached or already stale)."""
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] < now:
+                del self._data[key]
+                entry = None
+        return None if entry is None else entry[0] - now
+
+    def items(self):
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            return [(k, v) for k, (_, v) in self._data.items()]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class AccessTracker:
+    """
+    Exponentially decayed query counts per grid cell.
+
+    At most `max_cells` cells are tracked: once over the cap, cells whose
+    score has decayed below `min_score` are forgotten, then the coldest
+    until the table is back to 90% of the cap.
+    """
+
+    def __init__(self, half_life=24 * 3600, max_cells=10000, min_score=0.01):
+        self.half_life = half_life
+        self.max_cells = max_cells
+        self.min_score = min_score
+        self._lock = threading.Lock()
+        self._scores = {}
+        self._stamp = {}
+
+    def _decayed(self, cell, now):
+        age = now - self._stamp.get(cell, now)
+        return self._scores.get(cell, 0.0) * 0.5 ** (age / self.half_life)
+
+    def _prune(self, now):
+        scored = sorted((self._decayed(c, now), c) for c in self._scores)
+        keep_from = max(len(scored) - int(self.max_cells * 0.9), 0)
+        for i, (score, cell) in enumerate(scored):
+            if i >= keep_from and score >= self.min_score:
+                break
+            del self._scores[cell]
+            del self._stamp[cell]
+
+    def record(self, cell):
+        now = time.time()
+        with self._lock:
+            self._scores[cell] = self._decayed(cell, now) + 1.0
+            self._stamp[cell] = now
+            if len(self._scores) > self.max_cells:
+                self._prune(now)
+
+    def hottest(self, n, min_score=0.0):
+        """The n highest-scoring cells, ignoring any that have decayed below min_score."""
+        now = time.time()
+        with self._lock:
+            scored = [(self._decayed(c, now), c) for c in self._scores]
+        scored = sorted((sc for sc in scored if sc[0] >= min_score), reverse=True)
+        return [c for _, c in scored[:n]]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._scores)
+
+
+class SingleFlight:
+    """
+    Collapse concurrent computations of the same key into one.
+
+    The first caller for a key runs `fn`; callers arriving while it runs
+    wait for and share its result (or exception) instead of starting
+    their own. A waiter with a higher upstream priority than the caller
+    running `fn` raises the rest of that run to its own priority, so user
+    requests never wait behind BACKFILL admission.
+    """
+
+    class _Call:
+        def __init__(self, priority):
+            self.done = threading.Event()
+            self.priority = priority
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}   # key -> _Call
+
+    def do(self, key, fn, *args, wait=True, **kwargs):
+        """
+        Run fn(*args, **kwargs) unless it is already running for `key`.
+        With wait=False a caller that finds it running returns None at once.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call(Priority(scheduler.current_priority()))
+
+        if not leader:
+            if not wait:
+                return None
+            scheduler.raise_priority(call.priority, scheduler.current_priority())
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with scheduler.priority(call.priority):
+                call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+class PreWarmer(threading.Thread):
+    """
+    Background thread that keeps the hottest cells warm.
+
+    Every `interval` seconds it walks the `top_n` most queried cells whose
+    decayed score is still at least `min_score` (the default is one query
+    within the last half-life) and re-runs `refresh(cell)` for any whose cached entry is missing or will
+    go stale within `refresh_ahead` seconds. A cycle stops early once it
+    has spent `budget_s` seconds or refreshed `max_refresh` cells.
+    Refreshes run at BACKFILL priority so they queue behind user traffic.
+    """
+
+    def __init__(self, tracker, cache, refresh, top_n=200, interval=300,
+                 refresh_ahead=2 * 3600, budget_s=120, max_refresh=20, min_score=0.5):
+        super().__init__(name="cache-prewarmer", daemon=True)
+        self.tracker = tracker
+        self.cache = cache
+        self.refresh = refresh
+        self.top_n = top_n
+        self.interval = interval
+        self.refresh_ahead = refresh_ahead
+        self.budget_s = budget_s
+        self.max_refresh = max_refresh
+        self.min_score = min_score
+        self._stop_event = threading.Event()
+
+    def run_once(self):
+        started = time.monotonic()
+        refreshed = 0
+        for cell in self.tracker.hottest(self.top_n, self.min_score):
+            if refreshed >= self.max_refresh or time.monotonic() - started >= self.budget_s:
+                break
+            remaining = self.cache.expires_in(cell)
+            if remaining is not None and remaining > self.refresh_ahead:
+                continue
+            try:
+                with scheduler.priority(BACKFILL):
+                    self.refresh(cell)
+                refreshed += 1
+            except Exception as e:
+                print("Pre-warm failed for", cell, e)
+        return refreshed
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.run_once()
+
+    def stop(self):
+        self._stop_event.set()
@@ -0,0 +1,245 @@
+import atexit
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from cache import cell_of
+
+# Fixed histogram bins per variable: (low, high, bin width).
+# The histogram is the quantile sketch; values outside the range go to the end bins.
+VARIABLES = {
+    "tmin":          (-50.0, 40.0, 0.5),    # °C, Open-Meteo daily min
+    "tmax":          (-50.0, 40.0, 0.5),    # °C, Open-Meteo daily max
+    "pressure_hPa":  (900.0, 1100.0, 1.0),  # ERA5-Land surface pressure
+    "sm_surface":    (0.0, 0.8, 0.005),     # SMAP L4 m³/m³
+    "LST_Day":       (-50.0, 60.0, 0.5),    # MODIS °C
+    "LST_Night":     (-50.0, 60.0, 0.5),
+}
+
+
+def _n_bins(variable):
+    low, high, width = VARIABLES[variable]
+    return int(math.ceil((high - low) / width))
+
+
+def _bin_of(variable, value):
+    low, _, width = VARIABLES[variable]
+    return min(max(int((value - low) // width), 0), _n_bins(variable) - 1)
+
+
+def day_of_year(date):
+    """
+    Day of year on a 365-day calendar, so Mar 1 is always day 60 and a
+    leap year's Feb 29 shares Feb 28's slot.
+    """
+    doy = date.dayofyear
+    if date.is_leap_year and (date.month, date.day) >= (2, 29):
+        doy -= 1
+    return doy
+
+
+class ClimatologyStore:
+    """
+    Per-cell, per-day-of-year (see day_of_year) streaming aggregates
+    backed by SQLite.
+
+    Each row holds count, mean and M2 (Welford's running variance) plus a
+    fixed-bin histogram used as a quantile sketch. Adding a day touches one
+    row, and reading a season touches one row per day of year, no matter
+    how many years have been ingested.
+
+    Every ingested (cell, variable, date) is recorded, so re-fetching an
+    overlapping range never counts a day twice, while ranges older than
+    what is already stored are still added.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("CLIMATOLOGY_DB", "climatology.db")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS climatology (
+                lat REAL, lon REAL, variable TEXT, doy INTEGER,
+                count INTEGER, mean REAL, m2 REAL, hist TEXT,
+                PRIMARY KEY (lat, lon, variable, doy)
+            );
+            CREATE TABLE IF NOT EXISTS ingested (
+                lat REAL, lon REAL, variable TEXT, date TEXT,
+                PRIMARY KEY (lat, lon, variable, date)
+            ) WITHOUT ROWID;
+        """)
+
+    def update(self, lat, lon, variable, date, value):
+        """Add one day's observation. Returns False if it was already ingested."""
+        return self.ingest(lat, lon, variable, [date], [value]) == 1
+
+    def ingest(self, lat, lon, variable, dates, values):
+        """
+        Add a series of daily observations for a location, skipping NaNs and
+        any date already ingested for it. Returns the number of days added.
+        """
+        if variable not in VARIABLES:
+            raise ValueError(f"Unknown climatology variable '{variable}'")
+        cell = cell_of(lat, lon)
+        dates = pd.to_datetime(pd.Series(dates)).dt.normalize()
+        values = pd.to_numeric(pd.Series(values), errors="coerce")
+
+        if dates.empty:
+            return 0
+
+        added = []
+        with self._lock, self._conn:
+            seen = {r[0] for r in self._conn.execute(
+                "SELECT date FROM ingested WHERE lat=? AND lon=? AND variable=? AND date BETWEEN ? AND ?",
+                (*cell, variable, dates.min().strftime("%Y-%m-%d"), dates.max().strftime("%Y-%m-%d")),
+            )}
+            for date, value in zip(dates, values):
+                key = date.strftime("%Y-%m-%d")
+                if pd.isna(value) or key in seen:
+                    continue
+                seen.add(key)
+                added.append((key, day_of_year(date), float(value)))
+            if not added:
+                return 0
+
+            rows = {
+                doy: [count, mean, m2, json.loads(hist)]
+                for doy, count, mean, m2, hist in self._conn.execute(
+                    "SELECT doy, count, mean, m2, hist FROM climatology "
+                    "WHERE lat=? AND lon=? AND variable=?",
+                    (*cell, variable),
+                )
+            }
+            for _, doy, value in added:
+                row = rows.setdefault(doy, [0, 0.0, 0.0, [0] * _n_bins(variable)])
+                row[0] += 1
+                delta = value - row[1]
+                row[1] += delta / row[0]
+                row[2] += delta * (value - row[1])
+                row[3][_bin_of(variable, value)] += 1
+
+            touched = {doy for _, doy, _ in added}
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO climatology VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(*cell, variable, doy, *rows[doy][:3], json.dumps(rows[doy][3])) for doy in touched],
+            )
+            self._conn.executemany(
+                "INSERT INTO ingested VALUES (?, ?, ?, ?)",
+                [(*cell, variable, key) for key, _, _ in added],
+            )
+        return len(added)
+
+    def doy_stats(self, lat, lon, variable, doys=None, quantiles=(0.1, 0.5, 0.9)):
+        """
+        Climatology for a location, one row per day of year.
+
+        Returns
+        -------
+        pandas.DataFrame
+            Columns: ['doy', 'count', 'mean', 'std', 'q10', 'q50', 'q90', ...]
+        """
+        cell = cell_of(lat, lon)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doy, count, mean, m2, hist FROM climatology "
+                "WHERE lat=? AND lon=? AND variable=? ORDER BY doy",
+                (*cell, variable),
+            ).fetchall()
+
+        if doys is not None:
+            wanted = set(int(d) for d in doys)
+            rows = [r for r in rows if r[0] in wanted]
+
+        low, _, width = VARIABLES[variable]
+        records = []
+        for doy, count, mean, m2, hist in rows:
+            cdf = np.cumsum(json.loads(hist)) / count
+            rec = {
+                "doy": doy,
+                "count": count,
+                "mean": mean,
+                "std": math.sqrt(m2 / (count - 1)) if count > 1 else np.nan,
+            }
+            for q in quantiles:
+                # midpoint of the first bin whose CDF reaches q
+                rec[f"q{int(round(q * 100))}"] = low + (np.searchsorted(cdf, q) + 0.5) * width
+            records.append(rec)
+
+        return pd.DataFrame(records, columns=["doy", "count", "mean", "std"]
+                            + [f"q{int(round(q * 100))}" for q in quantiles])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide store, opened on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ClimatologyStore()
+        return _store
+
+
+class _Writer(threading.Thread):
+    """Feeds record() calls into the store off the request path."""
+
+    def __init__(self, maxsize=1000):
+        super().__init__(name="climatology-writer", daemon=True)
+        self.queue = queue.Queue(maxsize)
+
+    def run(self):
+        while True:
+            args = self.queue.get()
+            try:
+                get_store().ingest(*args)
+            except Exception as e:
+                print("Climatology ingest failed for", args[2], e)
+            finally:
+                self.queue.task_done()
+
+
+_writer = None
+
+
+def record(lat, lon, variable, dates, values):
+    """
+    Queue freshly fetched data for the store. Never blocks or breaks a
+    fetch: if the writer is too far behind, the batch is dropped.
+    """
+    global _writer
+    with _store_lock:
+        if _writer is None:
+            _writer = _Writer()
+            _writer.start()
+            atexit.register(flush)
+    try:
+        _writer.queue.put_nowait((lat, lon, variable, list(dates), list(values)))
+    except queue.Full:
+        print("Climatology writer behind, dropped", variable, "batch")
+
+
+def flush(timeout=30):
+    """Wait (up to `timeout` seconds) for queued batches to be written."""
+    if _writer is None:
+        return
+    deadline = time.monotonic() + timeout
+    while _writer.queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+if __name__ == "__main__":
+    store = ClimatologyStore(":memory:")
+    dates = pd.date_range("2000-01-01", "2024-12-31")
+    temps = 10 - 15 * np.cos(2 * np.pi * dates.dayofyear / 365) + np.random.randn(len(dates))
+    print("Ingested:", store.ingest(43.65, -79.75, "tmax", dates, temps))
+    print("Re-ingested:", store.ingest(43.65, -79.75, "tmax", dates, temps))
+    print(store.doy_stats(43.65, -79.75, "tmax", doys=range(60, 66)))
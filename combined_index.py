@@ -0,0 +1,45 @@
+import pandas as pd
+
+# Weights of each normalized factor in the combined index
+INDEX_WEIGHTS = {"lst": 0.4, "pressure": 0.3, "soil_moisture": 0.3}
+
+
+def calculate_index(
+    LST_day_normalized: pd.Series,
+    Pressure_day_normalized: pd.Series,
+    soil_moisture_normalized: pd.Series,
+    weights: dict | None = None
+):
+    """
+    Calculate a combined environmental index using the
+    normalized LST, pressure, and soil moisture data.
+    """
+
+    # Convert lists to pandas DataFrame for vector operations
+    LST_day_normalized = LST_day_normalized.fillna(0)
+    Pressure_day_normalized = Pressure_day_normalized.fillna(0)
+    soil_moisture_normalized = soil_moisture_normalized.fillna(0)
+
+    df = pd.DataFrame({
+        "LST_day_normalized": LST_day_normalized,
+        "Pressure_day_normalized": Pressure_day_normalized,
+        "soil_moisture_normalized": soil_moisture_normalized
+    })
+
+
+    # Example: simple weighted average index
+    weights = INDEX_WEIGHTS if weights is None else weights
+    df["combined_index"] = (
+        weights["lst"] * df["LST_day_normalized"] +
+        weights["pressure"] * df["Pressure_day_normalized"] +
+        weights["soil_moisture"] * df["soil_moisture_normalized"]
+    )
+
+    # # Optional normalization (0–1)
+    # df["combined_index_normalized"] = (
+    #     (df["combined_index"] - df["combined_index"].min()) /
+    #     (df["combined_index"].max() - df["combined_index"].min())
+    # )
+
+    print(df.head())
+    return df
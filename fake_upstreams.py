@@ -0,0 +1,216 @@
+"""
+In-process stand-ins for Earth Engine, Open-Meteo, Nominatim and Twilio.
+
+install() puts fake `ee`, `requests`, `geopy` and `twilio` modules into
+sys.modules, so it has to run before api (or any fetcher module) is
+imported. Each fake answers with smooth synthetic data for the requested
+place and dates, after sleeping for the configured per-upstream latency.
+"""
+import hashlib
+import math
+import random
+import sys
+import time
+import types
+from datetime import date, datetime, timedelta
+
+# Mean latency in seconds per upstream; jitter is lognormal around it
+LATENCY = {
+    "earthengine": 0.4,
+    "open-meteo": 0.15,
+    "nominatim": 0.1,
+    "twilio": 0.2,
+}
+JITTER = 0.3
+
+CALLS = {name: 0 for name in LATENCY}
+
+
+def _sleep(upstream):
+    CALLS[upstream] += 1
+    mean = LATENCY[upstream]
+    if mean > 0:
+        time.sleep(mean * random.lognormvariate(-JITTER ** 2 / 2, JITTER))
+
+
+def _days(start, end):
+    d = datetime.strptime(str(start)[:10], "%Y-%m-%d").date()
+    end = datetime.strptime(str(end)[:10], "%Y-%m-%d").date()
+    while d < end:
+        yield d
+        d += timedelta(days=1)
+
+
+def _season(d):
+    """-1 in mid-January, +1 in mid-July."""
+    return -math.cos(2 * math.pi * (d.timetuple().tm_yday - 15) / 365)
+
+
+# --------------------------------------------------
+# 🛰️ Earth Engine
+# --------------------------------------------------
+class _Any:
+    """Absorbs any attribute access or call (geometries, filters, reducers...)."""
+
+    def __getattr__(self, name):
+        return _Any()
+
+    def __call__(self, *args, **kwargs):
+        return _Any()
+
+
+class _ImageCollection:
+    def __init__(self, collection_id, start=None, end=None):
+        self.id = collection_id
+        self.start = start
+        self.end = end
+
+    def filterDate(self, start, end):
+        return _ImageCollection(self.id, start, end)
+
+    def _same(self, *args, **kwargs):
+        return self
+
+    select = filter = filterBounds = map = _same
+
+    def _rows(self):
+        end = self.end or date.today().isoformat()
+        start = self.start or (date.today() - timedelta(days=365)).isoformat()
+        rows = []
+        for d in _days(start, end):
+            s = _season(d)
+            rows.append({
+                "date": d.isoformat(),
+                "pressure_hPa": round(1010 + 6 * math.sin(d.toordinal() / 3.1), 2),
+                "sm_surface": round(0.25 + 0.08 * math.sin(d.toordinal() / 11.0), 4),
+                "LST_Day": round(8 + 18 * s + 3 * math.sin(d.toordinal() / 2.3), 2),
+                "LST_Night": round(-2 + 16 * s, 2),
+            })
+        return rows
+
+    def aggregate_array(self, key):
+        field = "date" if key == "datetime" else key
+        outer = self
+
+        class _Array:
+            def getInfo(self):
+                _sleep("earthengine")
+                return [r[field] for r in outer._rows()]
+        return _Array()
+
+    def getInfo(self):
+        _sleep("earthengine")
+        rows = self._rows()
+        if "MOD11A1" in self.id:
+            props = [{"time": r["date"], "LST_Day": r["LST_Day"], "LST_Night": r["LST_Night"]} for r in rows]
+        else:
+            props = [{"date": r["date"], "sm_surface": r["sm_surface"]} for r in rows]
+        return {"type": "FeatureCollection", "features": [{"properties": p} for p in props]}
+
+
+def _fake_ee():
+    ee = types.ModuleType("ee")
+    ee.Initialize = lambda *a, **k: None
+    ee.Authenticate = lambda *a, **k: None
+    ee.ImageCollection = _ImageCollection
+    for name in ("Geometry", "Filter", "Reducer", "Feature", "Number", "Date", "Image"):
+        setattr(ee, name, _Any())
+    return ee
+
+
+# --------------------------------------------------
+# 🌤️ Open-Meteo (via requests)
+# --------------------------------------------------
+class _Response:
+    def __init__(self, payload, status_code=200):
+        self._payload = payload
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._payload
+
+
+def _open_meteo_get(url, params=None, timeout=None, **kwargs):
+    _sleep("open-meteo")
+    times, temps = [], []
+    for d in _days(params["start_date"], (datetime.strptime(params["end_date"], "%Y-%m-%d")
+                                          + timedelta(days=1)).strftime("%Y-%m-%d")):
+        # daily mean climbs through zero in early spring; ±6 °C diurnal swing
+        mean = 2 + 14 * _season(d) + 3 * math.sin(d.toordinal() / 4.0)
+        for h in range(24):
+            times.append(f"{d.isoformat()}T{h:02d}:00")
+            temps.append(round(mean + 6 * math.sin(2 * math.pi * (h - 9) / 24), 1))
+    return _Response({"hourly": {"time": times, "temperature_2m": temps}})
+
+
+def _fake_requests():
+    requests = types.ModuleType("requests")
+    requests.get = _open_meteo_get
+    return requests
+
+
+# --------------------------------------------------
+# 📍 Nominatim (via geopy)
+# --------------------------------------------------
+class _Location:
+    def __init__(self, lat, lon):
+        self.latitude = lat
+        self.longitude = lon
+
+
+class _Nominatim:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def geocode(self, address):
+        _sleep("nominatim")
+        # Deterministic spot in southern Ontario sugar-bush country
+        h = hashlib.sha256(address.encode("utf-8")).digest()
+        lat = 42.5 + 4.0 * int.from_bytes(h[:4], "big") / 2 ** 32
+        lon = -81.5 + 6.0 * int.from_bytes(h[4:8], "big") / 2 ** 32
+        return _Location(round(lat, 6), round(lon, 6))
+
+
+def _fake_geopy():
+    geopy = types.ModuleType("geopy")
+    geocoders = types.ModuleType("geopy.geocoders")
+    exc = types.ModuleType("geopy.exc")
+    geocoders.Nominatim = _Nominatim
+    exc.GeocoderServiceError = type("GeocoderServiceError", (Exception,), {})
+    geopy.geocoders, geopy.exc = geocoders, exc
+    return {"geopy": geopy, "geopy.geocoders": geocoders, "geopy.exc": exc}
+
+
+# --------------------------------------------------
+# 📱 Twilio
+# --------------------------------------------------
+class _Messages:
+    def create(self, body, from_, to):
+        _sleep("twilio")
+        return types.SimpleNamespace(sid="SM" + hashlib.md5(f"{to}{body}{time.time()}".encode()).hexdigest())
+
+
+class _Client:
+    def __init__(self, *args, **kwargs):
+        self.messages = _Messages()
+
+
+def _fake_twilio():
+    twilio = types.ModuleType("twilio")
+    rest = types.ModuleType("twilio.rest")
+    rest.Client = _Client
+    twilio.rest = rest
+    return {"twilio": twilio, "twilio.rest": rest}
+
+
+def install(latency=None):
+    """Register the fakes in sys.modules. `latency` overrides LATENCY entries (seconds)."""
+    LATENCY.update(latency or {})
+    sys.modules["ee"] = _fake_ee()
+    sys.modules["requests"] = _fake_requests()
+    sys.modules.update(_fake_geopy())
+    sys.modules.update(_fake_twilio())
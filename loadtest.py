@@ -0,0 +1,381 @@
+"""
+End-to-end load test for the FastAPI app with stubbed upstreams.
+
+    python loadtest.py run --rate 20 --duration 60 --out run.json
+    python loadtest.py compare baseline.json run.json
+
+The app is served by uvicorn in a background thread of this process, with
+fake_upstreams standing in for Earth Engine, Open-Meteo, Nominatim and
+Twilio (or, with --record/--replay, the real clients through transport).
+Requests arrive open-loop (Poisson) at the target rate with a mix of:
+
+    single  - a location never asked for before
+    repeat  - one of a small set of hot locations
+    batch   - a burst of new locations sent together (like an alert job)
+    sms     - a /send-sms post
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import fake_upstreams
+
+MIX = {"single": 0.45, "repeat": 0.45, "batch": 0.08, "sms": 0.02}
+
+# Probe delays at least this long count as the event loop being stalled
+STALL_S = 0.05
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def _summary(values):
+    return {
+        "count": len(values),
+        "p50": _percentile(values, 0.50),
+        "p95": _percentile(values, 0.95),
+        "p99": _percentile(values, 0.99),
+        "max": max(values) if values else None,
+    }
+
+
+def _lag_summary(lags):
+    """
+    Percentiles of the probe's lag samples, plus totals over stalls. A stall
+    yields a single sample however long it lasts, so percentiles alone
+    under-weight long stalls; `stalled_s` adds them up.
+    """
+    stalls = [lag for lag in lags if lag >= STALL_S]
+    return _summary(lags) | {"stalls": len(stalls), "stalled_s": round(sum(stalls), 4)}
+
+
+def _rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _parse_kv(text, cast=float):
+    return {k: cast(v) for k, v in (item.split("=") for item in text.split(",") if item)}
+
+
+# --------------------------------------------------
+# 🖥️ In-process server
+# --------------------------------------------------
+class _Server:
+    """uvicorn in a thread, with an event-loop lag probe running on its loop."""
+
+    def __init__(self, app, probe_interval=0.01):
+        import uvicorn
+
+        self.lags = []          # (t, lag_s)
+        self.probe_interval = probe_interval
+
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+
+        app.on_event("startup")(self._start_probe)
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port,
+                                                    log_level="warning", lifespan="on"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    async def _probe(self):
+        while True:
+            before = time.perf_counter()
+            await asyncio.sleep(self.probe_interval)
+            self.lags.append((time.time(), time.perf_counter() - before - self.probe_interval))
+
+    async def _start_probe(self):
+        self._probe_task = asyncio.get_running_loop().create_task(self._probe())
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+# --------------------------------------------------
+# 🚚 Load generator
+# --------------------------------------------------
+async def _drive(base_url, rate, duration, mix, hot_locations, batch_size, timeout, seed):
+    import httpx
+
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    hot = [f"Sugar bush {i}, Ontario" for i in range(hot_locations)]
+    fresh = iter(f"Farm {seed}-{i}, Ontario" for i in range(10 ** 9))
+
+    results = []   # (t_start, kind, latency_s, ok)
+    tasks = set()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout,
+                                 limits=httpx.Limits(max_connections=1000)) as client:
+
+        async def one(kind, send):
+            t0 = time.perf_counter()
+            started = time.time()
+            try:
+                r = await send()
+                ok = r.status_code < 400
+            except Exception:
+                ok = False
+            results.append((started, kind, time.perf_counter() - t0, ok))
+
+        def post_location(location):
+            return lambda: client.post("/freeze-thaw", json={"location": location})
+
+        def launch(kind, send):
+            task = asyncio.create_task(one(kind, send))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        end = time.perf_counter() + duration
+        next_at = time.perf_counter()
+        while next_at < end:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            kind = rng.choices(kinds, weights)[0]
+            if kind == "single":
+                launch(kind, post_location(next(fresh)))
+            elif kind == "repeat":
+                launch(kind, post_location(rng.choice(hot)))
+            elif kind == "batch":
+                for _ in range(batch_size):
+                    launch(kind, post_location(next(fresh)))
+            else:
+                launch(kind, lambda: client.post("/send-sms", data={"to": "+15555550100",
+                                                                    "message": "Sap is running"}))
+            next_at += rng.expovariate(rate)
+
+        if tasks:
+            await asyncio.wait(tasks)
+    return results
+
+
+def run(args):
+    os.environ.setdefault("CLIMATOLOGY_DB", os.path.join(tempfile.mkdtemp(), "climatology.db"))
+    os.environ.setdefault("TWILIO_ACCOUNT_SID", "AC_fake")
+    os.environ.setdefault("TWILIO_AUTH_TOKEN", "fake")
+    os.environ.setdefault("TWILIO_PHONE_NUMBER", "+15555550000")
+
+    import transport
+
+    replaying = bool(args.record or args.replay)
+    if replaying:
+        # Real client libraries, recorded from / replayed to the cassette directory
+        transport.configure(mode="record" if args.record else "replay",
+                            directory=args.record or args.replay,
+                            latency=args.latency or {}, error_rate=args.error_rate or {}, seed=args.seed)
+    else:
+        fake_upstreams.install(_parse_kv(args.latency) if args.latency else None)
+        fake_upstreams.JITTER = args.jitter
+        transport.configure(error_rate=args.error_rate or {}, seed=args.seed)
+
+    import api
+    from scheduler import scheduler
+
+    if args.no_upstream_limits:
+        for name in list(scheduler.stats()):
+            scheduler.configure(name, rate=1e6, burst=1e6, concurrency=10 ** 6)
+
+    mix = _parse_kv(args.mix) if args.mix else MIX
+    memory = []
+    stop = threading.Event()
+
+    def sample_memory():
+        while not stop.wait(args.sample_interval):
+            memory.append((time.time(), round(_rss_mb(), 1)))
+
+    print(f"Driving {args.rate} req/s for {args.duration}s, mix={mix}", file=sys.stderr)
+    sink = io.StringIO()
+    with _Server(api.app) as server, contextlib.redirect_stdout(sink):
+        sampler = threading.Thread(target=sample_memory, daemon=True)
+        sampler.start()
+        t0 = time.time()
+        results = asyncio.run(_drive(f"http://127.0.0.1:{server.port}", args.rate, args.duration,
+                                     mix, args.hot_locations, args.batch_size, args.timeout, args.seed))
+        wall = time.time() - t0
+        stop.set()
+        lags = list(server.lags)
+        upstream_stats = scheduler.stats()
+
+    ok = [r for r in results if r[3]]
+    by_kind = {}
+    for kind in mix:
+        by_kind[kind] = _summary([r[2] for r in ok if r[1] == kind])
+
+    report = {
+        "config": vars(args) | {"mix": mix, "latency": (transport.stats()["latency"] if replaying
+                                                        else dict(fake_upstreams.LATENCY))},
+        "wall_s": round(wall, 2),
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "throughput_rps": round(len(ok) / wall, 2) if wall else 0.0,
+        "latency_s": _summary([r[2] for r in ok]),
+        "latency_by_kind_s": by_kind,
+        "event_loop_lag_s": _lag_summary([lag for _, lag in lags]),
+        "memory_mb": {
+            "start": memory[0][1] if memory else None,
+            "peak": max(m for _, m in memory) if memory else None,
+            "end": memory[-1][1] if memory else None,
+            "series": [(round(t - t0, 2), m) for t, m in memory],
+        },
+        "event_loop_lag_series": [(round(t - t0, 2), round(lag, 4))
+                                  for t, lag in lags[::max(1, len(lags) // 500)]],
+        # Fake upstreams count their own calls; real clients are counted by transport
+        "upstream_calls": None if replaying else dict(fake_upstreams.CALLS),
+        "upstream_transport": transport.stats(),
+        "upstream_scheduler": upstream_stats,
+    }
+
+    _print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved report to {args.out}")
+    return report
+
+
+def _fmt(v):
+    return "-" if v is None else f"{v * 1000:.1f}ms"
+
+
+def _print_report(report):
+    lat = report["latency_s"]
+    print(f"\nRequests: {report['requests']}  errors: {report['errors']}  "
+          f"throughput: {report['throughput_rps']} req/s")
+    print(f"Latency   p50 {_fmt(lat['p50'])}  p95 {_fmt(lat['p95'])}  p99 {_fmt(lat['p99'])}")
+    for kind, s in report["latency_by_kind_s"].items():
+        print(f"  {kind:<7} n={s['count']:<6} p50 {_fmt(s['p50'])}  p95 {_fmt(s['p95'])}  p99 {_fmt(s['p99'])}")
+    lag = report["event_loop_lag_s"]
+    print(f"Loop lag  p50 {_fmt(lag['p50'])}  p99 {_fmt(lag['p99'])}  max {_fmt(lag['max'])}  "
+          f"stalled {lag['stalled_s']:.2f}s over {lag['stalls']} stalls >= {_fmt(STALL_S)}")
+    mem = report["memory_mb"]
+    print(f"Memory    start {mem['start']}MB  peak {mem['peak']}MB  end {mem['end']}MB")
+    if report["upstream_calls"] is not None:
+        print(f"Upstream calls {report['upstream_calls']}")
+    else:
+        t = report["upstream_transport"]
+        print(f"Upstream transport ({t['mode']} from {t['directory']})")
+        for name, counts in t["upstreams"].items():
+            print(f"  {name:<12} {counts}")
+    print("Upstream scheduler")
+    for name, s in report["upstream_scheduler"].items():
+        print(f"  {name:<12} admitted {s['admitted']}  avg wait {_fmt(s['avg_wait_s'])}  "
+              f"max wait {_fmt(s['max_wait_s'])}")
+
+
+# --------------------------------------------------
+# ⚖️ Compare two runs
+# --------------------------------------------------
+COMPARED = [
+    # (label, path into report, higher_is_better, floor)
+    # A change only counts once it exceeds both the relative threshold and
+    # the metric's absolute floor, so run-to-run noise is not a regression.
+    ("throughput_rps", ("throughput_rps",), True, 0.5),
+    ("errors", ("errors",), False, 2),
+    ("latency p50", ("latency_s", "p50"), False, 0.05),
+    ("latency p95", ("latency_s", "p95"), False, 0.1),
+    ("latency p99", ("latency_s", "p99"), False, 0.2),
+    ("loop lag p99", ("event_loop_lag_s", "p99"), False, 0.025),
+    ("loop lag max", ("event_loop_lag_s", "max"), False, 0.1),
+    ("loop stalled s", ("event_loop_lag_s", "stalled_s"), False, 0.5),
+    ("memory peak", ("memory_mb", "peak"), False, 25),
+]
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        cand = json.load(f)
+
+    regressions = []
+    print(f"{'metric':<16}{'baseline':>14}{'candidate':>14}{'change':>10}")
+    for label, path, higher_is_better, floor in COMPARED:
+        b, c = base, cand
+        for key in path:
+            b, c = b.get(key) if b else None, c.get(key) if c else None
+        if b is None or c is None:
+            continue
+        change = (c - b) / b if b else (0.0 if c == b else float("inf"))
+        worse = -change if higher_is_better else change
+        worse_by = (b - c) if higher_is_better else (c - b)
+        flag = "  REGRESSION" if worse > args.threshold and worse_by > floor * args.floor_scale else ""
+        if flag:
+            regressions.append(label)
+        print(f"{label:<16}{b:>14.4g}{c:>14.4g}{change:>+10.1%}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%} and their floors: "
+              f"{', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="drive the app and report")
+    p.add_argument("--rate", type=float, default=10, help="target arrivals per second")
+    p.add_argument("--duration", type=float, default=30, help="seconds of load")
+    p.add_argument("--mix", help="e.g. single=0.5,repeat=0.4,batch=0.1,sms=0")
+    p.add_argument("--hot-locations", type=int, default=20, help="size of the repeated-location set")
+    p.add_argument("--batch-size", type=int, default=10)
+    p.add_argument("--latency", help="upstream latency in seconds, e.g. earthengine=0.5,nominatim=0.05 "
+                                     "(with --replay, 'recorded' replays the recorded latencies)")
+    p.add_argument("--error-rate", help="injected upstream failure rate, e.g. open-meteo=0.05")
+    p.add_argument("--record", metavar="DIR", help="use the real upstreams and record their responses into DIR")
+    p.add_argument("--replay", metavar="DIR",
+                   help="replay responses recorded in DIR instead of using fakes (same --seed and mix as recorded)")
+    p.add_argument("--jitter", type=float, default=fake_upstreams.JITTER, help="lognormal sigma of latency")
+    p.add_argument("--no-upstream-limits", action="store_true",
+                   help="lift the scheduler's rate limits to measure the app alone")
+    p.add_argument("--timeout", type=float, default=120)
+    p.add_argument("--sample-interval", type=float, default=1.0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="write the JSON report here")
+
+    c = sub.add_parser("compare", help="compare two saved reports")
+    c.add_argument("baseline")
+    c.add_argument("candidate")
+    c.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    c.add_argument("--floor-scale", type=float, default=1.0,
+                   help="multiply every metric's absolute floor (0 to compare on the threshold alone)")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
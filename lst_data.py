@@ -4,51 +4,34 @@ import numpy as np
 import matplotlib.pyplot as plt
 import datetime
 
+import transport
+from normalization import normalize_lst
+from climatology import record
 
-def ret_normalized_land_temperature(start_date, end_date, lat, long, project = 'bramhackstest'):
-    ee.Authenticate()
-    ee.Initialize(project = project)
+
+def fetch_modis_lst(start_date, end_date, lat, long, project = 'bramhackstest'):
+    """
+    Download daily MODIS day/night LST (°C) around a point.
+
+    Returns a DataFrame with columns ['time', 'LST_Day', 'LST_Night'].
+    """
+    transport.ee_initialize(project)
 
     # Example: Quebec maple forest area
-    area = ee.Geometry.Point([lat, long]).buffer(5000)  # 5 km buffer
+    area = ee.Geometry.Point([long, lat]).buffer(5000)  # EE takes [lon, lat]; 5 km buffer
 
     # 1️⃣ MODIS Land Surface Temperature (MOD11A1)
     # LST values are scaled by 0.02 and originally in Kelvin
 
-    # 1️⃣ Convert start_date to datetime
-    start_date_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d")
-
-    # 2️⃣ Subtract 2 years
-    start_date_2yrs_ago = start_date_dt.replace(year=start_date_dt.year - 2)
-
-    new_start_date = start_date_2yrs_ago.strftime('%Y-%m-%d')
-
-    end_date = datetime.datetime.today().strftime("%Y-%m-%d")
-
     modis = (
         ee.ImageCollection('MODIS/061/MOD11A1')
         .filterBounds(area)
-        .filterDate(new_start_date, end_date)
+        .filterDate(start_date, end_date)
         .select(['LST_Day_1km', 'LST_Night_1km'])
         .map(lambda img: img.multiply(0.02).subtract(273.15)  # Convert K → °C
             .copyProperties(img, ['system:time_start']))
     )
 
-    # 2️⃣ SMAP Soil & Temperature Data
-    # SMAP surface_temp and rootzone_temp are already in Kelvin (convert too)
-    smap = (
-        ee.ImageCollection('NASA/SMAP/SPL4SMGP/008')
-        .filterBounds(area)
-        .filterDate(start_date, end_date)
-        .filter(ee.Filter.listContains('system:band_names', 'rootzone_temp'))
-        .select(['surface_temp', 'rootzone_temp', 
-                'surface_soil_moisture', 'rootzone_soil_moisture'])
-        .map(lambda img: img.addBands(
-            img.select(['surface_temp', 'rootzone_temp']).subtract(273.15),  # Convert K → °C
-            overwrite=True
-        ))
-    )
-
     # Extract mean values for each image
     modis_fc = modis.map(lambda img: ee.Feature(None, {
         'time': img.date().format('YYYY-MM-dd'),
@@ -64,7 +47,7 @@ def ret_normalized_land_temperature(start_date, end_date, lat, long, project = '
 
     print(modis_fc)
 
-    modis_list = modis_fc.getInfo()['features']
+    modis_list = transport.call("earthengine", modis_fc.getInfo)['features']
 
     modis_df = pd.DataFrame([f['properties'] for f in modis_list])
 
@@ -75,12 +58,22 @@ def ret_normalized_land_temperature(start_date, end_date, lat, long, project = '
     modis_df = modis_df.dropna(subset=['LST_Day', 'LST_Night']).copy()
     modis_df['time'] = pd.to_datetime(modis_df['time'])
     modis_df = modis_df.sort_values('time').reset_index(drop=True)
+    record(lat, long, 'LST_Day', modis_df['time'], modis_df['LST_Day'])
+    record(lat, long, 'LST_Night', modis_df['time'], modis_df['LST_Night'])
 
+    return modis_df
+
+
+def predict_lst(modis_df, start_date, end_date):
+    """
+    Predict daily LST for [start_date, end_date] as the mean of the same
+    day of year one to two years earlier, then normalize it to 0–1.
+    """
     # === Compute 5-year rolling daily climatology ===
     predictions = []
 
-    start_date = pd.Timestamp('2026-02-01')
-    end_date = pd.Timestamp('2026-04-01')
+    start_date = pd.Timestamp(start_date)
+    end_date = pd.Timestamp(end_date)
 
     # Create a list of all dates to fill
     all_dates = pd.date_range(start=start_date, end=end_date)
@@ -117,9 +110,26 @@ def ret_normalized_land_temperature(start_date, end_date, lat, long, project = '
     # pred_df['LST_Night_predicted'] = pred_df['LST_Night_predicted'].interpolate(method='linear')
 
     # Normalize between 0 and 1
-    pred_df['LST_Day_normalized'] = (pred_df['LST_Day_predicted'] - pred_df['LST_Day_predicted'].min()) / \
-                                    (pred_df['LST_Day_predicted'].max() - pred_df['LST_Day_predicted'].min())
+    pred_df['LST_Day_normalized'] = normalize_lst(pred_df['LST_Day_predicted'].to_numpy())
+
+    return pred_df
+
+
+def ret_normalized_land_temperature(start_date, end_date, lat, long, project = 'bramhackstest'):
+
+    # 1️⃣ Convert start_date to datetime
+    start_date_dt = datetime.datetime.strptime(start_date, "%Y-%m-%d")
+
+    # 2️⃣ Subtract 2 years
+    start_date_2yrs_ago = start_date_dt.replace(year=start_date_dt.year - 2)
+
+    new_start_date = start_date_2yrs_ago.strftime('%Y-%m-%d')
+
+    end_date = transport.today().strftime("%Y-%m-%d")
+
+    modis_df = fetch_modis_lst(new_start_date, end_date, lat, long, project = project)
 
+    pred_df = predict_lst(modis_df, '2026-02-01', '2026-04-01')
 
     modis_df_final = pd.merge(modis_df, pred_df, left_on='time', right_on='date', how='right')
     print(modis_df_final.columns)
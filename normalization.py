@@ -0,0 +1,106 @@
+import numpy as np
+
+
+class Curve:
+    """
+    Piecewise normalization curve declared as breakpoints and compiled to
+    lookup arrays, so it can be evaluated over arrays of any shape at once.
+
+    Parameters
+    ----------
+    xs : sequence of float
+        Increasing breakpoints.
+    ys : sequence of float
+        Value at each breakpoint (same length as xs).
+    mode : {"linear", "step"}
+        "linear" interpolates between breakpoints.
+        "step" holds ys[i] on the half-open interval [xs[i], xs[i+1]).
+    left : float
+        Value for inputs below xs[0].
+    right : float or None
+        Value for inputs above xs[-1] ("linear" only; defaults to ys[-1]).
+
+    NaN inputs always map to NaN.
+    """
+
+    def __init__(self, xs, ys, mode="linear", left=None, right=None):
+        self.xs = np.asarray(xs, dtype=float)
+        self.ys = np.asarray(ys, dtype=float)
+        if self.xs.ndim != 1 or self.xs.shape != self.ys.shape:
+            raise ValueError("xs and ys must be 1-D and the same length")
+        if np.any(np.diff(self.xs) <= 0):
+            raise ValueError("xs must be strictly increasing")
+        if mode not in ("linear", "step"):
+            raise ValueError(f"Unknown interpolation mode '{mode}'")
+
+        self.mode = mode
+        self.left = float(self.ys[0] if left is None else left)
+        self.right = float(self.ys[-1] if right is None else right)
+
+        # Step lookup table: index 0 is "below the first breakpoint"
+        self._table = np.concatenate(([self.left], self.ys))
+
+    def __call__(self, values):
+        x = np.asarray(values, dtype=float)
+        if self.mode == "linear":
+            out = np.interp(x, self.xs, self.ys, left=self.left, right=self.right)
+        else:
+            out = self._table[np.searchsorted(self.xs, x, side="right")]
+        out = np.where(np.isnan(x), np.nan, out)
+        return out if out.ndim else float(out)
+
+
+# Barometric pressure (hPa) -> 0–1 sap flow potential.
+# Low pressure favours flow; anything above 1015 hPa scores 0.
+PRESSURE_CURVE = Curve(
+    xs=[990, 995, 1005, 1013, 1015],
+    ys=[1.0, 0.9, 0.7, 0.5, 0.25],
+    mode="linear",
+    left=1.0,
+    right=0.0,
+)
+
+# SMAP surface soil moisture (m³/m³) -> 0–1 sap flow potential.
+# Bands are contiguous, so values between the old hand-written ranges
+# (e.g. 0.17–0.18) now take the band below instead of dropping to 0.
+SMAP_CURVE = Curve(
+    xs=[0.14, 0.18, 0.21, 0.42, np.nextafter(0.54, np.inf)],
+    ys=[0.5, 0.7, 1.0, 0.6, 0.4],
+    mode="step",
+    left=0.0,
+)
+
+
+def minmax(values, axis=-1):
+    """
+    NaN-aware min–max scaling to [0, 1] along `axis` (days, for a
+    sites × days batch). Constant rows come back as NaN, like the
+    original pandas expression.
+    """
+    x = np.asarray(values, dtype=float)
+    lo = np.nanmin(x, axis=axis, keepdims=True)
+    hi = np.nanmax(x, axis=axis, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (x - lo) / (hi - lo)
+
+
+def normalize_pressure(values):
+    return PRESSURE_CURVE(values)
+
+
+def normalize_soil_moisture(values):
+    return SMAP_CURVE(values)
+
+
+def normalize_lst(values, axis=-1):
+    return minmax(values, axis=axis)
+
+
+if __name__ == "__main__":
+    # Batch of 3 sites × 4 days
+    pressure = np.array([[985, 992.5, 1010, 1020],
+                         [1013, 1014, 1015, np.nan],
+                         [1000, 1000, 1000, 1000]])
+    print(normalize_pressure(pressure))
+    print(normalize_soil_moisture([0.1, 0.14, 0.175, 0.2, 0.3, 0.54, 0.6]))
+    print(normalize_lst([[1.0, 2.0, 3.0], [5.0, np.nan, 7.0]]))
@@ -0,0 +1,218 @@
+import contextlib
+import contextvars
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import wraps
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 50))   # newest profiles kept on disk
+
+_current = contextvars.ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """
+    Sampling profile of one request.
+
+    Only threads that are running work for this request (see `profiled`)
+    are sampled, so concurrent requests don't leak into it. Stacks are kept
+    in folded form ("root;child;leaf count"), which flamegraph.pl,
+    speedscope and inferno all read directly.
+    """
+
+    def __init__(self, path, interval=SAMPLE_INTERVAL):
+        self.id = uuid.uuid4().hex[:12]
+        self.path = path
+        self.interval = interval
+        self.started = time.time()
+        self.duration = None
+        self.stacks = Counter()
+        self.upstream_calls = []
+        self._threads = Counter()    # thread id -> nesting depth
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profiler-{self.id}", daemon=True)
+
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            with self._lock:
+                tids = list(self._threads)
+            frames = sys._current_frames()
+            for tid in tids:
+                frame = frames.get(tid)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                with self._lock:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def enter_thread(self):
+        with self._lock:
+            self._threads[threading.get_ident()] += 1
+
+    def exit_thread(self):
+        tid = threading.get_ident()
+        with self._lock:
+            self._threads[tid] -= 1
+            if self._threads[tid] <= 0:
+                del self._threads[tid]
+
+    def record_upstream(self, name, wait_s, call_s, error=None):
+        with self._lock:
+            self.upstream_calls.append({
+                "upstream": name,
+                "offset_s": round(time.time() - self.started, 4),
+                "queue_wait_s": round(wait_s, 4),
+                "call_s": round(call_s, 4),
+                "error": error,
+            })
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def summary(self):
+        by_upstream = {}
+        for call in self.upstream_calls:
+            agg = by_upstream.setdefault(call["upstream"], {"calls": 0, "queue_wait_s": 0.0, "call_s": 0.0})
+            agg["calls"] += 1
+            agg["queue_wait_s"] = round(agg["queue_wait_s"] + call["queue_wait_s"], 4)
+            agg["call_s"] = round(agg["call_s"] + call["call_s"], 4)
+        return {
+            "id": self.id,
+            "path": self.path,
+            "started": self.started,
+            "duration_s": self.duration,
+            "samples": sum(self.stacks.values()),
+            "sample_interval_s": self.interval,
+            "upstream_totals": by_upstream,
+            "upstream_calls": self.upstream_calls,
+        }
+
+
+# --------------------------------------------------
+# Request lifecycle
+# --------------------------------------------------
+def requested(request):
+    """Profiling is opt-in per request: `X-Profile: 1` header or `?profile=1`."""
+    flag = request.headers.get("x-profile") or request.query_params.get("profile")
+    return flag in ("1", "true", "yes")
+
+
+def authorized(request):
+    """
+    Only callers sending ADMIN_TOKEN in an `X-Admin-Token` header may profile
+    (never a query parameter, which ends up in URLs and access logs); an
+    unset token disables profiling.
+    """
+    expected = os.getenv("ADMIN_TOKEN")
+    given = request.headers.get("x-admin-token") or ""
+    return bool(expected) and hmac.compare_digest(given, expected)
+
+
+def start(path):
+    profile = RequestProfile(path)
+    _current.set(profile)
+    profile._sampler.start()
+    return profile
+
+
+def finish(profile):
+    profile._done.set()
+    profile._sampler.join()
+    profile.duration = round(time.time() - profile.started, 4)
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, f"{profile.id}.folded"), "w") as f:
+        f.write(profile.folded())
+    with open(os.path.join(PROFILE_DIR, f"{profile.id}.json"), "w") as f:
+        json.dump(profile.summary(), f, indent=2)
+    _prune()
+
+
+def _prune(keep=None):
+    """Delete all but the newest `keep` (PROFILE_KEEP) profiles."""
+    keep = PROFILE_KEEP if keep is None else keep
+    try:
+        summaries = [e for e in os.scandir(PROFILE_DIR) if e.name.endswith(".json")]
+        summaries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in summaries[keep:]:
+            profile_id = entry.name[:-len(".json")]
+            for ext in ("json", "folded"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(PROFILE_DIR, f"{profile_id}.{ext}"))
+    except OSError as e:
+        print("Profile pruning failed:", e)
+
+
+def profiled(fn):
+    """
+    Sample the calling thread while `fn` runs, if the current request is
+    being profiled. Wrap synchronous work handed to the threadpool (or run
+    inline on the event loop) with this.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        profile.enter_thread()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.exit_thread()
+    return wrapper
+
+
+def record_upstream(name, wait_s, call_s, error=None):
+    profile = _current.get()
+    if profile is not None:
+        profile.record_upstream(name, wait_s, call_s, error)
+
+
+# --------------------------------------------------
+# Retrieval
+# --------------------------------------------------
+def _path(profile_id, ext):
+    if not profile_id.isalnum():
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.{ext}")
+    return path if os.path.isfile(path) else None
+
+
+def list_profiles():
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    out = []
+    for name in sorted(os.listdir(PROFILE_DIR)):
+        if name.endswith(".json"):
+            with open(os.path.join(PROFILE_DIR, name)) as f:
+                meta = json.load(f)
+            out.append({k: meta[k] for k in ("id", "path", "started", "duration_s", "samples")})
+    return sorted(out, key=lambda m: m["started"], reverse=True)
+
+
+def load_summary(profile_id):
+    path = _path(profile_id, "json")
+    if path is None:
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_folded(profile_id):
+    path = _path(profile_id, "folded")
+    if path is None:
+        return None
+    with open(path) as f:
+        return f.read()
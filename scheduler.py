@@ -0,0 +1,209 @@
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+from profiling import record_upstream
+
+# Admission priorities (lower is served first)
+INTERACTIVE = 0
+BACKFILL = 1
+
+# Rough sustainable limits for each upstream we call.
+#   rate          -> tokens refilled per second
+#   burst         -> bucket size
+#   concurrency   -> max calls in flight at once
+DEFAULT_LIMITS = {
+    "nominatim":   {"rate": 1.0,  "burst": 1,  "concurrency": 1},   # 1 req/s usage policy
+    "open-meteo":  {"rate": 5.0,  "burst": 10, "concurrency": 4},
+    "earthengine": {"rate": 10.0, "burst": 20, "concurrency": 8},
+    "twilio":      {"rate": 1.0,  "burst": 5,  "concurrency": 2},   # 1 msg/s per number
+}
+
+_current_priority = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+class Priority:
+    """
+    A priority level that can be raised while work runs under it (see
+    UpstreamScheduler.raise_priority), e.g. when a user request ends up
+    waiting on a computation the pre-warmer started at BACKFILL.
+    """
+
+    def __init__(self, level):
+        self.level = level
+
+    def __repr__(self):
+        return f"Priority({self.level})"
+
+
+def _level(priority):
+    return priority.level if isinstance(priority, Priority) else priority
+
+
+class Upstream:
+    """Token bucket + concurrency cap for one upstream, admitting waiters by priority."""
+
+    def __init__(self, name, rate, burst, concurrency):
+        self.name = name
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.concurrency = int(concurrency)
+
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._last_refill = time.monotonic()
+        self._waiting = []          # heap of [level, seq, priority]
+        self._seq = itertools.count()
+        self._in_flight = 0
+
+        self._admitted = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _take_token(self):
+        """Take a token if one is available, otherwise return seconds until the next one."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self, priority=INTERACTIVE):
+        ticket = [_level(priority), next(self._seq), priority]
+        enqueued = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                if self._waiting[0] is ticket and self._in_flight < self.concurrency:
+                    delay = self._take_token()
+                    if delay == 0:
+                        break
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._in_flight += 1
+
+            waited = time.monotonic() - enqueued
+            self._admitted += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+            # Let the next waiter re-check whether it is now at the head
+            self._cond.notify_all()
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def reprioritize(self):
+        """Re-order waiters whose Priority was raised while they were queued."""
+        with self._cond:
+            changed = False
+            for ticket in self._waiting:
+                if ticket[0] != _level(ticket[2]):
+                    ticket[0] = _level(ticket[2])
+                    changed = True
+            if changed:
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queue_depth": len(self._waiting),
+                "in_flight": self._in_flight,
+                "admitted": self._admitted,
+                "avg_wait_s": round(self._wait_total / self._admitted, 4) if self._admitted else 0.0,
+                "max_wait_s": round(self._wait_max, 4),
+            }
+
+
+class UpstreamScheduler:
+    """
+    Single admission point for every outbound call (Nominatim, Open-Meteo,
+    Earth Engine, Twilio).
+
+    Usage
+    -----
+    scheduler.call("open-meteo", requests.get, url, params=params)
+
+    with scheduler.slot("earthengine"):
+        info = fc.getInfo()
+
+    with scheduler.priority(BACKFILL):
+        ...  # every call made in here queues behind interactive traffic
+    """
+
+    def __init__(self, limits=None):
+        self._lock = threading.Lock()
+        self._upstreams = {}
+        for name, cfg in (limits or DEFAULT_LIMITS).items():
+            self.configure(name, **cfg)
+
+    def configure(self, name, rate, burst, concurrency):
+        with self._lock:
+            self._upstreams[name] = Upstream(name, rate, burst, concurrency)
+
+    def _get(self, name):
+        try:
+            return self._upstreams[name]
+        except KeyError:
+            raise ValueError(f"Unknown upstream '{name}'") from None
+
+    @contextmanager
+    def priority(self, level):
+        """
+        Run the enclosed block (and every upstream call it makes) at the given
+        priority: a level, or a Priority that may be raised meanwhile.
+        """
+        token = _current_priority.set(level)
+        try:
+            yield
+        finally:
+            _current_priority.reset(token)
+
+    def current_priority(self):
+        """The level upstream calls made here would queue at."""
+        return _level(_current_priority.get())
+
+    def raise_priority(self, priority, level):
+        """Raise a Priority to `level` (if higher) and re-order its queued calls."""
+        if level < priority.level:
+            priority.level = level
+            with self._lock:
+                upstreams = list(self._upstreams.values())
+            for upstream in upstreams:
+                upstream.reprioritize()
+
+    @contextmanager
+    def slot(self, name, priority=None):
+        upstream = self._get(name)
+        queued = time.perf_counter()
+        upstream.acquire(_current_priority.get() if priority is None else priority)
+        admitted = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            upstream.release()
+            record_upstream(name, admitted - queued, time.perf_counter() - admitted, error)
+
+    def call(self, name, fn, *args, priority=None, **kwargs):
+        with self.slot(name, priority):
+            return fn(*args, **kwargs)
+
+    def stats(self):
+        return {name: up.stats() for name, up in self._upstreams.items()}
+
+
+scheduler = UpstreamScheduler()
@@ -0,0 +1,105 @@
+import math
+import threading
+import time
+from datetime import datetime
+
+from cache import GRID_DEG
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+class CellIndex:
+    """
+    Grid-hash index over computed cells.
+
+    Buckets are the same GRID_DEG cells used by the caches, so a lookup only
+    has to scan the handful of buckets within `max_km` of the query point.
+    Entries expire like the cache entries they mirror; expired ones are
+    skipped by nearest() and dropped.
+    """
+
+    def __init__(self, grid=GRID_DEG, ttl=None, purge_interval=60):
+        self.grid = grid
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._lock = threading.Lock()
+        self._buckets = {}   # (i, j) -> (expires_at, lat, lon, value)
+        self._next_purge = time.time() + purge_interval
+
+    def _bucket(self, lat, lon):
+        return math.floor(lat / self.grid), math.floor(lon / self.grid)
+
+    def _purge(self, now):
+        expired = [b for b, entry in self._buckets.items() if entry[0] < now]
+        for b in expired:
+            del self._buckets[b]
+        self._next_purge = now + self.purge_interval
+
+    def add(self, lat, lon, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        with self._lock:
+            self._buckets[self._bucket(lat, lon)] = (now + ttl if ttl is not None else math.inf, lat, lon, value)
+            if now >= self._next_purge:
+                self._purge(now)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def nearest(self, lat, lon, k=4, max_km=50):
+        """Return up to k unexpired (distance_km, lat, lon, value) tuples within max_km, closest first."""
+        i0, j0 = self._bucket(lat, lon)
+        ri = math.ceil(max_km / (KM_PER_DEG * self.grid))
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        rj = math.ceil(max_km / (KM_PER_DEG * self.grid * cos_lat))
+
+        now = time.time()
+        found = []
+        with self._lock:
+            for i in range(i0 - ri, i0 + ri + 1):
+                for j in range(j0 - rj, j0 + rj + 1):
+                    entry = self._buckets.get((i, j))
+                    if entry is None:
+                        continue
+                    expires_at, e_lat, e_lon, value = entry
+                    if expires_at < now:
+                        del self._buckets[(i, j)]
+                        continue
+                    d = haversine_km(lat, lon, e_lat, e_lon)
+                    if d <= max_km:
+                        found.append((d, e_lat, e_lon, value))
+        found.sort(key=lambda e: e[0])
+        return found[:k]
+
+
+def interpolate_pick_dates(neighbours):
+    """
+    Inverse-distance weighted estimate of the freeze–thaw dates from
+    neighbouring cells' results (as returned by CellIndex.nearest).
+    """
+    keys = ("start_date_freeze_thaw", "pick_date", "end_date_freeze_thaw")
+
+    # An exact hit (same spot) just returns that cell's answer
+    if neighbours[0][0] < 1e-6:
+        return {k: neighbours[0][3][k] for k in keys}
+
+    weights = [1 / d ** 2 for d, *_ in neighbours]
+    total = sum(weights)
+
+    est = {}
+    for key in keys:
+        ordinals = [datetime.fromisoformat(v[key]).toordinal() for _, _, _, v in neighbours]
+        mean = sum(w * o for w, o in zip(weights, ordinals)) / total
+        day = datetime.fromordinal(round(mean))
+        # keep the neighbours' format ("YYYY-MM-DD" vs full datetime)
+        est[key] = str(day.date()) if len(neighbours[0][3][key]) == 10 else str(day)
+    return est
@@ -0,0 +1,269 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+from functools import lru_cache
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+# Build-only dependencies; the server side never needs them
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+SITE_DIR = "myMapleSite"
+DIST_DIR = os.path.join(SITE_DIR, "dist")
+
+IMAGE_WIDTHS = [480, 960, 1600, 2400]
+COMPRESSIBLE = {".html", ".css", ".js", ".ttf", ".svg", ".json"}
+HASHED_NAME = re.compile(r"\.[0-9a-f]{10}\.[^./]+$")
+
+ONE_YEAR = 365 * 24 * 3600
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("font/ttf", ".ttf")
+
+
+# --------------------------------------------------
+# 🏗️ Build step
+# --------------------------------------------------
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _hashed_name(rel_path, data):
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{_digest(data)}{ext}"
+
+
+def _write(rel_path, data):
+    """Write an output file plus .gz/.br siblings for text-like types."""
+    out = os.path.join(DIST_DIR, rel_path)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "wb") as f:
+        f.write(data)
+
+    if os.path.splitext(rel_path)[1] in COMPRESSIBLE:
+        with open(out + ".gz", "wb") as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(out + ".br", "wb") as f:
+                f.write(brotli.compress(data, quality=11))
+
+
+def _webp_variants(rel_path, data):
+    """Encode WebP copies of an image at each width below its own; returns [(width, name)]."""
+    if Image is None:
+        print("Pillow not installed, skipping WebP variants for", rel_path)
+        return []
+
+    src = Image.open(os.path.join(SITE_DIR, rel_path))
+    widths = [w for w in IMAGE_WIDTHS if w < src.width] + [src.width]
+    root = os.path.splitext(rel_path)[0]
+
+    variants = []
+    for w in widths:
+        img = src if w == src.width else src.resize((w, round(src.height * w / src.width)), Image.LANCZOS)
+        tmp = os.path.join(DIST_DIR, f"{root}-{w}.webp.tmp")
+        os.makedirs(os.path.dirname(tmp), exist_ok=True)
+        img.save(tmp, "WEBP", quality=80, method=6)
+        with open(tmp, "rb") as f:
+            webp = f.read()
+        os.remove(tmp)
+
+        name = _hashed_name(f"{root}-{w}.webp", webp)
+        _write(name, webp)
+        variants.append((w, name))
+    return variants
+
+
+def _rewrite_css(css, manifest, variants):
+    css = re.sub(
+        r"url\(\s*['\"]?([^'\")]+)['\"]?\s*\)",
+        lambda m: f"url('{manifest.get(m.group(1), m.group(1))}')",
+        css,
+    )
+
+    # Responsive WebP backgrounds: one media query per width, largest first,
+    # so the narrowest matching query wins
+    extra = []
+    for selector, body in re.findall(r"([^{}]+)\{([^{}]*)\}", css):
+        m = re.search(r"background-image:\s*url\('([^']+)'\)", body)
+        if not m:
+            continue
+        original = next((k for k, v in manifest.items() if v == m.group(1)), None)
+        if original not in variants:
+            continue
+        fallback_type = mimetypes.guess_type(original)[0]
+        ordered = sorted(variants[original], reverse=True)
+        for w, name in ordered:
+            rule = (f"{selector.strip()} {{ background-image: image-set("
+                    f"url('{name}') type('image/webp'), url('{m.group(1)}') type('{fallback_type}')); }}")
+            if w == ordered[0][0]:
+                extra.append(rule)
+            else:
+                extra.append(f"@media (max-width: {w}px) {{ {rule} }}")
+    return css + ("\n" + "\n".join(extra) + "\n" if extra else "")
+
+
+def _rewrite_html(html, manifest, variants):
+    def img_tag(m):
+        tag, src = m.group(0), m.group(2)
+        hashed = manifest.get(src, src)
+        tag = tag.replace(m.group(1) + src + m.group(1), m.group(1) + hashed + m.group(1))
+        if src not in variants:
+            return tag
+        pct = re.search(r"width\s*=\s*['\"]?(\d+)%", tag)
+        sizes = f"{pct.group(1)}vw" if pct else "100vw"
+        srcset = ", ".join(f"{name} {w}w" for w, name in variants[src])
+        return f'<picture><source type="image/webp" srcset="{srcset}" sizes="{sizes}">{tag}</picture>'
+
+    html = re.sub(r"<img\b[^>]*?\bsrc\s*=\s*(['\"])([^'\"]+)\1[^>]*>", img_tag, html)
+    return re.sub(
+        r"\b(href|src)\s*=\s*(['\"])([^'\"]+)\2",
+        lambda m: f"{m.group(1)}={m.group(2)}{manifest.get(m.group(3), m.group(3))}{m.group(2)}",
+        html,
+    )
+
+
+def build():
+    """
+    Produce myMapleSite/dist: content-hashed copies of every asset, gzip
+    (and brotli, if installed) siblings for text-like files, WebP variants
+    of images at several widths, and an index.html/styles.css rewritten to
+    point at them. A manifest.json maps original paths to hashed ones.
+    """
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+
+    manifest, variants = {}, {}
+    text_files = []
+    for root, dirs, files in os.walk(SITE_DIR):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != DIST_DIR]
+        for fname in files:
+            rel = os.path.relpath(os.path.join(root, fname), SITE_DIR).replace(os.sep, "/")
+            ext = os.path.splitext(rel)[1]
+            if ext in (".html", ".css"):
+                text_files.append(rel)   # rewritten once everything else is hashed
+                continue
+            with open(os.path.join(SITE_DIR, rel), "rb") as f:
+                data = f.read()
+            manifest[rel] = _hashed_name(rel, data)
+            _write(manifest[rel], data)
+            if ext in (".jpg", ".jpeg", ".png"):
+                variants[rel] = _webp_variants(rel, data)
+
+    # CSS first so the HTML can point at the hashed stylesheet
+    for rel in sorted(text_files, key=lambda r: r.endswith(".html")):
+        with open(os.path.join(SITE_DIR, rel), encoding="utf-8") as f:
+            text = f.read()
+        if rel.endswith(".css"):
+            data = _rewrite_css(text, manifest, variants).encode("utf-8")
+            manifest[rel] = _hashed_name(rel, data)
+            _write(manifest[rel], data)
+        else:
+            # Entry points keep their names; they are revalidated on every visit
+            _write(rel, _rewrite_html(text, manifest, variants).encode("utf-8"))
+
+    _write("manifest.json", json.dumps(manifest, indent=2).encode("utf-8"))
+    print(f"Built {len(manifest)} assets into {DIST_DIR}")
+    return manifest
+
+
+# --------------------------------------------------
+# 📦 Serving
+# --------------------------------------------------
+@lru_cache(maxsize=512)
+def _file_digest(path, mtime, size):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def _etag_matches(etag, if_none_match):
+    """If-None-Match comparison (weak, per RFC 9110 for GET/HEAD)."""
+    if if_none_match.strip() == "*":
+        return True
+    tags = (t.strip() for t in if_none_match.split(","))
+    return any(t.removeprefix("W/") == etag for t in tags)
+
+
+def _accepted_encodings(header):
+    """Accept-Encoding -> {coding: q}; codings not listed take the q of '*' (0 if absent)."""
+    accepted = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def _resolve(rel_path):
+    """Find a request path in dist/, falling back to the source tree (unbuilt dev checkout)."""
+    rel_path = os.path.normpath(rel_path or "index.html").lstrip(os.sep)
+    if rel_path.startswith(".."):
+        return None
+    for base in (DIST_DIR, SITE_DIR):
+        candidate = os.path.join(base, rel_path)
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def serve_asset(request: Request, rel_path: str):
+    """
+    Serve a site file with ETag revalidation and, when the client accepts
+    it, a precompressed .br/.gz sibling. Content-hashed names are cached as
+    immutable for a year; everything else must revalidate.
+    """
+    path = _resolve(rel_path)
+    if path is None:
+        return Response(status_code=404)
+
+    st = os.stat(path)
+    if HASHED_NAME.search(path):
+        cache_control = f"public, max-age={ONE_YEAR}, immutable"
+    else:
+        cache_control = "no-cache"
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+    # Each encoding is a different representation, so it gets its own ETag
+    body, encoding = path, None
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    best = 0.0
+    for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+        q = accepted.get(candidate, accepted.get("*", 0.0))
+        if q > best and os.path.isfile(path + suffix):
+            body, encoding, best = path + suffix, candidate, q
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    digest = _file_digest(path, st.st_mtime, st.st_size)
+    etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+    headers["ETag"] = etag
+
+    if _etag_matches(etag, request.headers.get("if-none-match", "")):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return FileResponse(body, media_type=media_type, headers=headers)
+
+if __name__ == "__main__":
+    build()
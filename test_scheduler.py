@@ -0,0 +1,176 @@
+import threading
+import time
+
+from cache import SingleFlight
+from scheduler import Upstream, UpstreamScheduler, Priority, scheduler, INTERACTIVE, BACKFILL
+
+
+def _admission_order(upstream, priorities):
+    """
+    Hold the only slot, queue one waiter per priority (in the given order),
+    then release and return the indices of the waiters in admission order.
+    """
+    upstream.acquire()
+    order = []
+    threads = []
+    for i, level in enumerate(priorities):
+        def waiter(i=i, level=level):
+            upstream.acquire(level)
+            order.append(i)
+            upstream.release()
+        t = threading.Thread(target=waiter)
+        t.start()
+        threads.append(t)
+        # Make sure each waiter is queued before the next one arrives
+        while upstream.stats()["queue_depth"] < len(threads):
+            time.sleep(0.001)
+    upstream.release()
+    for t in threads:
+        t.join(timeout=5)
+    return order
+
+
+def test_priority_ordering():
+    upstream = Upstream("test", rate=1000, burst=1000, concurrency=1)
+    order = _admission_order(upstream, [BACKFILL, INTERACTIVE, BACKFILL, INTERACTIVE])
+    assert order == [1, 3, 0, 2]
+
+
+def test_same_priority_is_first_come_first_served():
+    upstream = Upstream("test", rate=1000, burst=1000, concurrency=1)
+    assert _admission_order(upstream, [BACKFILL] * 5) == [0, 1, 2, 3, 4]
+
+
+def test_burst_is_admitted_without_waiting():
+    upstream = Upstream("test", rate=1, burst=3, concurrency=10)
+    started = time.monotonic()
+    for _ in range(3):
+        upstream.acquire()
+        upstream.release()
+    assert time.monotonic() - started < 0.1
+
+
+def test_token_refill_paces_calls():
+    rate = 20.0
+    upstream = Upstream("test", rate=rate, burst=1, concurrency=10)
+    upstream.acquire()
+    upstream.release()
+
+    started = time.monotonic()
+    for _ in range(4):
+        upstream.acquire()
+        upstream.release()
+    elapsed = time.monotonic() - started
+
+    # Bucket was empty, so four more calls need four refills
+    assert elapsed >= 4 / rate * 0.9
+    assert elapsed < 4 / rate + 0.5
+    assert upstream.stats()["admitted"] == 5
+
+
+def test_refill_is_capped_at_burst():
+    upstream = Upstream("test", rate=100, burst=2, concurrency=10)
+    time.sleep(0.1)   # would refill 10 tokens without the cap
+    assert upstream._take_token() == 0.0
+    assert upstream._take_token() == 0.0
+    assert upstream._take_token() > 0
+
+
+def test_concurrency_cap():
+    upstream = Upstream("test", rate=1000, burst=1000, concurrency=2)
+    upstream.acquire()
+    upstream.acquire()
+    admitted = threading.Event()
+
+    def third():
+        upstream.acquire()
+        admitted.set()
+        upstream.release()
+
+    t = threading.Thread(target=third)
+    t.start()
+    assert not admitted.wait(0.1)
+    upstream.release()
+    assert admitted.wait(5)
+    t.join(timeout=5)
+    upstream.release()
+
+
+def test_scheduler_priority_context():
+    sched = UpstreamScheduler({"test": {"rate": 1000, "burst": 1000, "concurrency": 1}})
+    upstream = sched._get("test")
+    upstream.acquire()
+    order = []
+
+    def waiter(level):
+        with sched.priority(level):
+            with sched.slot("test"):
+                order.append(level)
+
+    threads = []
+    for level in (BACKFILL, INTERACTIVE):
+        t = threading.Thread(target=waiter, args=(level,))
+        t.start()
+        threads.append(t)
+        while upstream.stats()["queue_depth"] < len(threads):
+            time.sleep(0.001)
+    upstream.release()
+    for t in threads:
+        t.join(timeout=5)
+    assert order == [INTERACTIVE, BACKFILL]
+
+
+def test_raised_priority_reorders_queued_calls():
+    sched = UpstreamScheduler({"test": {"rate": 1000, "burst": 1000, "concurrency": 1}})
+    upstream = sched._get("test")
+    upstream.acquire()
+    raised = Priority(BACKFILL)
+    order = []
+
+    def waiter(name, priority):
+        upstream.acquire(priority)
+        order.append(name)
+        upstream.release()
+
+    threads = []
+    for name, priority in (("plain", BACKFILL), ("raised", raised)):
+        t = threading.Thread(target=waiter, args=(name, priority))
+        t.start()
+        threads.append(t)
+        while upstream.stats()["queue_depth"] < len(threads):
+            time.sleep(0.001)
+
+    sched.raise_priority(raised, INTERACTIVE)
+    upstream.release()
+    for t in threads:
+        t.join(timeout=5)
+    assert order == ["raised", "plain"]
+
+
+def test_single_flight_waiter_raises_leader_priority():
+    flight = SingleFlight()
+    started, proceed = threading.Event(), threading.Event()
+    seen = []
+
+    def compute():
+        started.set()
+        proceed.wait(5)
+        seen.append(scheduler.current_priority())
+
+    def prewarm():
+        with scheduler.priority(BACKFILL):
+            flight.do("cell", compute)
+
+    leader = threading.Thread(target=prewarm)
+    leader.start()
+    started.wait(5)
+
+    # An interactive request now waits on the same cell
+    follower = threading.Thread(target=flight.do, args=("cell", compute))
+    follower.start()
+    while flight._calls["cell"].priority.level != INTERACTIVE:
+        time.sleep(0.001)
+    proceed.set()
+    leader.join(timeout=5)
+    follower.join(timeout=5)
+    assert seen == [INTERACTIVE]
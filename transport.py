@@ -0,0 +1,409 @@
+"""
+Record/replay transport for every upstream client.
+
+UPSTREAM_MODE selects how outbound calls are made:
+
+    live    - call the real service (default)
+    record  - call the real service and save each response under UPSTREAM_CASSETTE_DIR
+    replay  - answer from the saved responses only; a missing one raises ReplayMiss
+
+Earth Engine is recorded at the HTTP level (through ee.Initialize's
+http_transport), so a replay needs no credentials or network at all.
+Open-Meteo, Nominatim and Twilio are recorded at the call level in call().
+
+Injected faults apply in every mode:
+
+    UPSTREAM_LATENCY     seconds added per call, e.g. "earthengine=0.4,nominatim=0.1",
+                         or "recorded" to replay the latency seen when recording
+    UPSTREAM_ERROR_RATE  probability a call fails, e.g. "open-meteo=0.05"
+    UPSTREAM_SEED        seed for the error draws (default 0)
+
+Fetches that depend on today's date (Predict, the pressure and LST history
+windows) take it from today()/now() instead of the system clock, so replays
+build the same requests on any later day:
+
+    UPSTREAM_TODAY       pin the date (YYYY-MM-DD) in any mode. Otherwise record
+                         mode saves the date it ran on to <cassette dir>/clock.json
+                         (or reuses the one there), replay reads it back and live
+                         uses the system date.
+
+stats() reports the settings in force and, per upstream, how many calls were
+made, recorded, replayed, missed in replay or failed by injection.
+"""
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime
+from types import SimpleNamespace
+
+from scheduler import scheduler
+
+UPSTREAMS = ("earthengine", "open-meteo", "nominatim", "twilio")
+
+
+class ReplayMiss(LookupError):
+    """Replay mode was asked for a response that was never recorded."""
+
+
+class InjectedUpstreamError(ConnectionError):
+    """Failure injected by UPSTREAM_ERROR_RATE."""
+
+
+class RecordedUpstreamError(RuntimeError):
+    """Replay of a call that failed while recording."""
+
+
+def _parse_per_upstream(text, cast=float):
+    """'a=1,b=2' -> {a: 1, b: 2}; a bare value applies to every upstream."""
+    if not text:
+        return {}
+    if "=" not in text:
+        return {name: text if text == "recorded" else cast(text) for name in UPSTREAMS}
+    out = {}
+    for item in text.split(","):
+        name, value = item.split("=")
+        out[name.strip()] = value if value == "recorded" else cast(value)
+    return out
+
+
+class _Config:
+    def __init__(self):
+        self.mode = os.getenv("UPSTREAM_MODE", "live")
+        self.directory = os.getenv("UPSTREAM_CASSETTE_DIR", "cassettes")
+        self.latency = _parse_per_upstream(os.getenv("UPSTREAM_LATENCY", ""))
+        self.error_rate = _parse_per_upstream(os.getenv("UPSTREAM_ERROR_RATE", ""))
+        self.rng = random.Random(int(os.getenv("UPSTREAM_SEED", 0)))
+        self.today = os.getenv("UPSTREAM_TODAY") or None
+        self.lock = threading.Lock()
+
+
+config = _Config()
+
+
+def configure(mode=None, directory=None, latency=None, error_rate=None, seed=None, today=None):
+    """Override the environment settings (e.g. from a benchmark script)."""
+    if mode is not None:
+        if mode not in ("live", "record", "replay"):
+            raise ValueError(f"Unknown upstream mode '{mode}'")
+        config.mode = mode
+    if directory is not None:
+        config.directory = directory
+    if latency is not None:
+        config.latency = _parse_per_upstream(latency) if isinstance(latency, str) else dict(latency)
+    if error_rate is not None:
+        config.error_rate = _parse_per_upstream(error_rate) if isinstance(error_rate, str) else dict(error_rate)
+    if seed is not None:
+        config.rng = random.Random(seed)
+    if today is not None:
+        config.today = str(today)
+
+
+# --------------------------------------------------
+# Reference clock
+# --------------------------------------------------
+_clocks = {}   # clock.json path -> date
+
+
+def today():
+    """The date date-dependent fetches should treat as today (see module docs)."""
+    if config.today:
+        return date.fromisoformat(config.today)
+    if config.mode == "live":
+        return date.today()
+
+    path = os.path.join(config.directory, "clock.json")
+    with config.lock:
+        if path not in _clocks:
+            if os.path.isfile(path):
+                with open(path) as f:
+                    _clocks[path] = date.fromisoformat(json.load(f)["today"])
+            elif config.mode == "replay":
+                raise ReplayMiss(f"No recorded clock at {path}; set UPSTREAM_TODAY to the recording date")
+            else:
+                os.makedirs(config.directory, exist_ok=True)
+                with open(path, "w") as f:
+                    json.dump({"today": date.today().isoformat()}, f)
+                _clocks[path] = date.today()
+        return _clocks[path]
+
+
+def now():
+    """today() at the current time of day."""
+    return datetime.combine(today(), datetime.now().time())
+
+
+# --------------------------------------------------
+# Counters
+# --------------------------------------------------
+_counts = {}   # upstream -> Counter of calls / http_requests / recorded / replayed / replay_misses / injected_errors
+
+
+def _count(upstream, event):
+    with config.lock:
+        _counts.setdefault(upstream, Counter())[event] += 1
+
+
+def stats():
+    """Current mode, injected faults and per-upstream counters."""
+    with config.lock:
+        return {
+            "mode": config.mode,
+            "directory": config.directory if config.mode != "live" else None,
+            "latency": dict(config.latency),
+            "error_rate": dict(config.error_rate),
+            "upstreams": {name: dict(c) for name, c in _counts.items()},
+        }
+
+
+# --------------------------------------------------
+# Cassette storage
+# --------------------------------------------------
+def _path(upstream, key):
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+    return os.path.join(config.directory, upstream, f"{digest}.json")
+
+
+def _load(upstream, key):
+    path = _path(upstream, key)
+    if not os.path.isfile(path):
+        _count(upstream, "replay_misses")
+        raise ReplayMiss(f"No recorded {upstream} response for {json.dumps(key, default=str)[:300]}")
+    _count(upstream, "replayed")
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save(upstream, key, entry):
+    path = _path(upstream, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"upstream": upstream, "key": key, "recorded_at": time.time(), **entry},
+                  f, indent=1, default=str)
+    os.replace(tmp, path)
+    _count(upstream, "recorded")
+
+
+def _inject(upstream, recorded_latency=None):
+    latency = config.latency.get(upstream)
+    if latency == "recorded":
+        latency = recorded_latency
+    if latency:
+        time.sleep(latency)
+
+    rate = config.error_rate.get(upstream, 0)
+    if rate:
+        with config.lock:
+            fail = config.rng.random() < rate
+        if fail:
+            _count(upstream, "injected_errors")
+            raise InjectedUpstreamError(f"Injected {upstream} failure")
+
+
+# --------------------------------------------------
+# Call-level recording (Open-Meteo, Nominatim, Twilio)
+# --------------------------------------------------
+class _ReplayResponse:
+    """Enough of requests.Response for the Open-Meteo client."""
+
+    def __init__(self, status_code, payload, url=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.url = url
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return json.dumps(self._payload)
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if not self.ok:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+def _http_key(fn, args, kwargs):
+    return {"method": "GET", "url": args[0] if args else kwargs.get("url"), "params": kwargs.get("params")}
+
+
+def _http_encode(r):
+    try:
+        payload = r.json()
+    except ValueError:
+        payload = r.text
+    return {"status_code": r.status_code, "url": getattr(r, "url", None), "payload": payload}
+
+
+def _http_decode(data):
+    return _ReplayResponse(data["status_code"], data["payload"], data.get("url"))
+
+
+def _geocode_encode(location):
+    if location is None:
+        return None
+    return {"latitude": location.latitude, "longitude": location.longitude,
+            "address": getattr(location, "address", None)}
+
+
+def _geocode_decode(data):
+    return None if data is None else SimpleNamespace(**data)
+
+
+# upstream -> (key, encode, decode); Earth Engine is handled by EEHttp instead
+CODECS = {
+    "open-meteo": (_http_key, _http_encode, _http_decode),
+    "nominatim": (
+        lambda fn, args, kwargs: {"query": args[0] if args else kwargs.get("query")},
+        _geocode_encode,
+        _geocode_decode,
+    ),
+    "twilio": (
+        lambda fn, args, kwargs: {k: kwargs.get(k) for k in ("to", "from_", "body")},
+        lambda msg: {"sid": msg.sid},
+        lambda data: SimpleNamespace(**data),
+    ),
+}
+
+
+def _exchange(upstream, fn, args, kwargs):
+    codec = CODECS.get(upstream)
+    if codec is None:
+        return fn(*args, **kwargs)
+    key_of, encode, decode = codec
+
+    if config.mode == "replay":
+        entry = _load(upstream, key_of(fn, args, kwargs))
+        _inject(upstream, entry.get("latency_s"))
+        if "error" in entry:
+            raise RecordedUpstreamError(entry["error"])
+        return decode(entry["response"])
+
+    _inject(upstream)
+    if config.mode == "live":
+        return fn(*args, **kwargs)
+
+    key = key_of(fn, args, kwargs)
+    started = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        _save(upstream, key, {"latency_s": time.perf_counter() - started,
+                              "error": f"{type(e).__name__}: {e}"})
+        raise
+    _save(upstream, key, {"latency_s": time.perf_counter() - started, "response": encode(result)})
+    return result
+
+
+def call(upstream, fn, *args, priority=None, **kwargs):
+    """
+    Make one outbound call: admitted by the scheduler, then recorded,
+    replayed or passed through according to UPSTREAM_MODE.
+    """
+    _count(upstream, "calls")
+    with scheduler.slot(upstream, priority):
+        return _exchange(upstream, fn, args, kwargs)
+
+
+# --------------------------------------------------
+# HTTP-level recording (Earth Engine)
+# --------------------------------------------------
+class EEHttp:
+    """
+    httplib2.Http-like transport for ee.Initialize(http_transport=...).
+
+    Live requests go to an inner client built by `make_inner`, one per
+    thread: ee shares its transport across every thread that calls it,
+    and clients like httplib2.Http are not thread-safe.
+
+    Request headers (which carry the OAuth token) are never stored; the key
+    is the method, URI and canonicalized body.
+    """
+
+    def __init__(self, make_inner=None):
+        self.make_inner = make_inner
+        self._local = threading.local()
+
+    @property
+    def inner(self):
+        inner = getattr(self._local, "inner", None)
+        if inner is None:
+            inner = self._local.inner = self.make_inner()
+        return inner
+
+    @staticmethod
+    def _key(uri, method, body):
+        if isinstance(body, bytes):
+            body = body.decode("utf-8", errors="replace")
+        try:
+            body = json.loads(body) if body else None
+        except ValueError:
+            pass
+        return {"method": method, "uri": uri, "body": body}
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        import httplib2
+
+        key = self._key(uri, method, body)
+        _count("earthengine", "http_requests")
+
+        if config.mode == "replay":
+            entry = _load("earthengine", key)
+            _inject("earthengine", entry.get("latency_s"))
+            return (httplib2.Response({"status": str(entry["status"]), **entry["headers"]}),
+                    base64.b64decode(entry["content_b64"]))
+
+        _inject("earthengine")
+        started = time.perf_counter()
+        response, content = self.inner.request(uri, method=method, body=body, headers=headers, **kwargs)
+        if config.mode == "record":
+            _save("earthengine", key, {
+                "latency_s": time.perf_counter() - started,
+                "status": response.status,
+                "headers": {k: v for k, v in response.items() if k in ("content-type",)},
+                "content_b64": base64.b64encode(content).decode("ascii"),
+            })
+        return response, content
+
+
+def _ee_default_http():
+    """
+    The requests-based transport ee builds when given none, so injected
+    latency and errors wrap the same HTTP stack as a plain live run.
+    """
+    try:
+        import requests
+        from ee import _cloud_api_utils
+        return _cloud_api_utils._Http(requests.Session())
+    except (ImportError, AttributeError, TypeError) as e:
+        import httplib2
+        print("Falling back to httplib2 for Earth Engine:", e)
+        return httplib2.Http(timeout=300)
+
+
+def ee_initialize(project):
+    """Initialize Earth Engine for the current UPSTREAM_MODE."""
+    import ee
+
+    if config.mode == "replay":
+        ee.Initialize(project=project, credentials=None, http_transport=EEHttp())
+        return
+
+    kwargs = {}
+    if config.mode == "record" or config.latency.get("earthengine") or config.error_rate.get("earthengine"):
+        kwargs["http_transport"] = EEHttp(_ee_default_http)
+    try:
+        ee.Initialize(project=project, **kwargs)
+    except Exception:
+        ee.Authenticate()
+        ee.Initialize(project=project, **kwargs)
@@ -2,11 +2,13 @@ import ssl
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderServiceError
 
+import transport
+
 def get_coordinates(address):
     geolocator = Nominatim(user_agent="geoapi", timeout=10)
     try:
         ssl._create_default_https_context = ssl._create_unverified_context
-        location = geolocator.geocode(address)
+        location = transport.call("nominatim", geolocator.geocode, address)
         if location:
             return location.latitude, location.longitude
         else: